@@ -0,0 +1,46 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+ASYNC_ROUTES = (
+    'recipes-list',
+    'recipes-detail',
+    'recipes-download-shopping-cart',
+    'ingredients-list',
+)
+
+
+def async_view(view):
+    """
+    Асинхронная обёртка над представлением DRF: обработка и рендеринг
+    ответа идут в пуле потоков, а цикл событий ASGI-сервера остаётся
+    свободным для медленных клиентов.
+    """
+    def run(request, *args, **kwargs):
+        close_old_connections()
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+        finally:
+            close_old_connections()
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await sync_to_async(run, thread_sensitive=False)(
+            request, *args, **kwargs
+        )
+
+    return wrapper
+
+
+def make_async(urlpatterns, names=ASYNC_ROUTES):
+    return [
+        URLPattern(
+            url.pattern, async_view(url.callback), url.default_args, url.name
+        ) if url.name in names else url
+        for url in urlpatterns
+    ]
@@ -0,0 +1,63 @@
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .catalog import ingredients_catalog
+
+
+def normalize(value):
+    """
+    Приводит строку к виду для сравнения: без регистра и с «е» вместо «ё».
+    """
+    return value.strip().casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """
+    Отсортированный по нормализованному названию индекс ингредиентов.
+    Строится из справочника и перестраивается при смене его поколения.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        # Поколение, ключи и ингредиенты заменяются одним присваиванием:
+        # поиск в другом потоке не увидит ключи одной версии с другой.
+        self._state = (None, [], [])
+
+    def refresh(self):
+        catalog = self.catalog.refresh()
+        state = self._state
+        if catalog.generation != state[0]:
+            entries = sorted(
+                (normalize(item['name']), index)
+                for index, item in enumerate(catalog.items)
+            )
+            state = (
+                catalog.generation,
+                [key for key, _ in entries],
+                [catalog.items[index] for _, index in entries],
+            )
+            self._state = state
+        return state
+
+    def search(self, query, limit=None):
+        """
+        Сначала ингредиенты, начинающиеся с запроса, затем содержащие его.
+        """
+        _, keys, items = self.refresh()
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        query = normalize(query)
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        results = items[start:min(end, start + limit)]
+        for index, key in enumerate(keys):
+            if len(results) >= limit:
+                break
+            if query in key and not start <= index < end:
+                results.append(items[index])
+        return results
+
+
+ingredient_index = IngredientIndex(ingredients_catalog)
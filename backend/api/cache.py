@@ -0,0 +1,172 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from uuid import uuid4
+
+from django.core.cache import cache
+
+# Сколько записей журнала процесс догоняет по одной, прежде чем
+# перестроить индекс целиком, и сколько секунд записи хранятся.
+MAX_CHANGES = 1000
+CHANGE_TIMEOUT = 60 * 60 * 24
+
+
+class CacheGeneration:
+    """
+    Поколение данных в общем кэше. Значение — время последнего изменения:
+    процессы сравнивают его со своим и строят по нему ETag.
+    """
+
+    def __init__(self, key):
+        self.key = key
+
+    def get(self):
+        return cache.get_or_set(self.key, time.time, timeout=None)
+
+    def bump(self):
+        cache.set(self.key, time.time(), timeout=None)
+
+
+class CacheVersions:
+    """
+    Версии записей по id в общем кэше. Версия входит в ключ данных
+    и читается до запроса к базе: смена версии при записи сбрасывает
+    данные, а собранные до неё ложатся под старый ключ и больше
+    не читаются. Отсутствующие версии создаются через add(): если
+    версию тем временем сменила запись, её id в ответе нет и данные
+    кэшировать нельзя.
+    """
+
+    def __init__(self, key):
+        self.key = key
+
+    def get_many(self, ids):
+        keys = {self.key.format(pk): pk for pk in ids}
+        versions = {
+            keys[key]: version
+            for key, version in cache.get_many(keys).items()
+        }
+        for key, pk in keys.items():
+            if pk not in versions:
+                version = uuid4().hex
+                if cache.add(key, version, timeout=None):
+                    versions[pk] = version
+        return versions
+
+    def get(self, pk):
+        return self.get_many((pk,)).get(pk)
+
+    def bump(self, ids):
+        cache.set_many(
+            {self.key.format(pk): uuid4().hex for pk in ids}, timeout=None
+        )
+
+
+class ProcessIndex(ABC):
+    """
+    Индекс рецептов в памяти процесса. Изменения пишутся в журнал
+    в общем кэше: счётчик хранит номер последней записи, а запись под
+    своим номером — id изменённых рецептов. Каждый процесс применяет
+    только записи, которых ещё не видел, и перестраивает индекс
+    целиком, лишь если отстал больше чем на MAX_CHANGES, записи
+    вытеснены из кэша или индекс сброшен через invalidate().
+    Строится при первом обращении. refresh() меняет структуры индекса
+    на месте под self._lock, поэтому читатели тоже берут эту блокировку:
+    запросы обслуживаются пулом потоков (api/async_views.py).
+    """
+
+    def __init__(self, name):
+        self.counter_key = f'index:{name}:changes'
+        self.epoch_key = f'index:{name}:epoch'
+        self.change_key = f'index:{name}:change:{{}}'
+        self._epoch = None
+        self._position = None
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def clear(self):
+        """
+        Очищает индекс.
+        """
+
+    @abstractmethod
+    def add(self, recipe_ids=None):
+        """
+        Добавляет в индекс рецепты (без recipe_ids — все) в их текущем
+        виде; отсутствующие в базе пропускаются.
+        """
+
+    @abstractmethod
+    def remove(self, recipe_id):
+        """
+        Убирает рецепт из индекса.
+        """
+
+    def start_epoch(self):
+        """
+        Новая эпоха журнала: все процессы перестроят индекс целиком.
+        """
+        cache.add(self.counter_key, 0, timeout=None)
+        cache.set(self.epoch_key, uuid4().hex, timeout=None)
+
+    def get_state(self):
+        state = cache.get_many((self.epoch_key, self.counter_key))
+        if len(state) < 2:
+            self.start_epoch()
+            state = cache.get_many((self.epoch_key, self.counter_key))
+        return state.get(self.epoch_key), state.get(self.counter_key, 0)
+
+    def get_changes(self, start, stop):
+        """
+        id рецептов из записей журнала с номерами от start до stop
+        включительно или None, если каких-то записей уже нет.
+        """
+        keys = [self.change_key.format(number)
+                for number in range(start, stop + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return None
+        return {pk for recipe_ids in changes.values() for pk in recipe_ids}
+
+    def rebuild(self):
+        self.clear()
+        self.add()
+
+    def refresh(self):
+        epoch, position = self.get_state()
+        with self._lock:
+            if (epoch != self._epoch or self._position is None
+                    or position < self._position
+                    or position - self._position > MAX_CHANGES):
+                self.rebuild()
+            elif position > self._position:
+                recipe_ids = self.get_changes(self._position + 1, position)
+                if recipe_ids is None:
+                    self.rebuild()
+                else:
+                    for recipe_id in recipe_ids:
+                        self.remove(recipe_id)
+                    self.add(recipe_ids)
+            else:
+                return
+            self._epoch, self._position = epoch, position
+
+    def update(self, recipe_ids):
+        """
+        Записывает в журнал изменение рецептов. Этот и другие процессы
+        применят его при следующем обращении к индексу.
+        """
+        try:
+            number = cache.incr(self.counter_key)
+        except ValueError:
+            # Счётчик вытеснен: номера начнутся заново, поэтому нужна
+            # новая эпоха.
+            self.start_epoch()
+            number = cache.incr(self.counter_key)
+        cache.set(
+            self.change_key.format(number), list(recipe_ids),
+            timeout=CHANGE_TIMEOUT
+        )
+
+    def invalidate(self):
+        self.start_epoch()
@@ -0,0 +1,64 @@
+from collections import namedtuple
+
+from django.core.cache import cache
+
+from foodgram.db_router import PRIMARY_DATABASE
+from recipes.models import Ingredient, Tag
+from .cache import CacheGeneration
+from .serializers import IngredientSerializer, TagSerializer
+
+CatalogState = namedtuple(
+    'CatalogState', ('generation', 'items', 'items_by_id')
+)
+
+
+class Catalog:
+    """
+    Справочник, сериализованный целиком: копия в памяти процесса
+    сверяется с поколением в общем кэше и перечитывается только
+    после изменений. Поколение и данные заменяются одним присваиванием
+    CatalogState, чтобы потоки процесса не увидели их вперемешку.
+    """
+
+    def __init__(self, name, model, serializer_class):
+        self.model = model
+        self.serializer_class = serializer_class
+        self.data_key = f'catalog:{name}:data'
+        self.generation = CacheGeneration(f'catalog:{name}:generation')
+        self._state = CatalogState(None, [], {})
+
+    def _load(self, generation):
+        cached = cache.get(self.data_key)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        # Из основной базы: справочник отстающей реплики остался бы
+        # в кэше до следующего изменения.
+        items = [dict(item) for item in self.serializer_class(
+            self.model.objects.using(PRIMARY_DATABASE), many=True
+        ).data]
+        cache.set(self.data_key, (generation, items), timeout=None)
+        return items
+
+    def refresh(self):
+        generation = self.generation.get()
+        state = self._state
+        if generation != state.generation:
+            items = self._load(generation)
+            state = CatalogState(
+                generation, items, {item['id']: item for item in items}
+            )
+            self._state = state
+        return state
+
+    def items(self):
+        return self.refresh().items
+
+    def get(self, pk):
+        return self.refresh().items_by_id.get(pk)
+
+    def invalidate(self):
+        self.generation.bump()
+
+
+tags_catalog = Catalog('tags', Tag, TagSerializer)
+ingredients_catalog = Catalog('ingredients', Ingredient, IngredientSerializer)
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Поколения справочников, индексов и кэшей ответов сверяются через
+    кэш: у кэша в памяти процесса сброс в одном воркере не виден
+    остальным.
+    """
+    if settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+        return [Warning(
+            'Кэш по умолчанию не общий для процессов: после изменений '
+            'другие воркеры будут отдавать устаревшие данные.',
+            hint='Задайте CACHE_BACKEND и CACHE_LOCATION, например '
+                 'PyMemcacheCache и memcached:11211.',
+            id='api.W001',
+        )]
+    return []
@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from foodgram.db_router import PRIMARY_DATABASE
+from recipes.models import Recipe, RecipeIngredient
+from .cache import CacheGeneration, CacheVersions
+from .serializers import RecipeDocumentSerializer
+
+CACHE_KEY = 'recipe-document:{}:{}:{}'
+
+generation = CacheGeneration('recipe-document:generation')
+versions = CacheVersions('recipe-document:version:{}')
+
+
+def build_documents(recipe_ids):
+    # Из основной базы: документ с данными отстающей реплики остался бы
+    # в кэше и после инвалидации.
+    recipes = Recipe.objects.using(PRIMARY_DATABASE).filter(
+        id__in=recipe_ids
+    ).prefetch_related(
+        'tags',
+        'author',
+        Prefetch(
+            'recipe_ingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        ),
+    )
+    return {
+        document['id']: document
+        for document in RecipeDocumentSerializer(recipes, many=True).data
+    }
+
+
+def get_documents(recipe_ids):
+    """
+    Готовые представления рецептов без признаков пользователя: из кэша,
+    а недостающие — сериализуются одним набором запросов и кэшируются.
+    Ключ документа включает версию рецепта, прочитанную до запроса
+    к базе: документ, собранный до записи, ляжет под старую версию
+    и читаться уже не будет.
+    """
+    current = generation.get()
+    recipe_versions = versions.get_many(recipe_ids)
+    keys = {
+        CACHE_KEY.format(current, pk, version): pk
+        for pk, version in recipe_versions.items()
+    }
+    documents = {
+        keys[key]: document
+        for key, document in cache.get_many(keys).items()
+    }
+    missing = [pk for pk in recipe_ids if pk not in documents]
+    if missing:
+        built = build_documents(missing)
+        cache.set_many({
+            CACHE_KEY.format(current, pk, recipe_versions[pk]): document
+            for pk, document in built.items() if pk in recipe_versions
+        }, timeout=settings.RECIPE_DOCUMENT_TIMEOUT)
+        documents.update(built)
+    return documents
+
+
+def render_recipes(request, state, recipe_ids, attributes=None):
+    """
+    Рецепты в порядке recipe_ids с признаками текущего пользователя
+    и абсолютными ссылками на картинки. attributes — дополнительные
+    поля по id рецепта. Удалённые за это время рецепты пропускаются.
+    """
+    documents = get_documents(recipe_ids)
+    recipes = []
+    for pk in recipe_ids:
+        document = documents.get(pk)
+        if document is None:
+            continue
+        recipe = dict(document)
+        author = recipe['author'] = dict(document['author'])
+        author['is_subscribed'] = state.contains('following', author['id'])
+        recipe['is_favorited'] = state.contains('favorites', pk)
+        recipe['is_in_shopping_cart'] = state.contains('cart', pk)
+        recipe['image'] = request.build_absolute_uri(document['image'])
+        recipe['images'] = {
+            rendition: request.build_absolute_uri(url)
+            for rendition, url in document['images'].items()
+        }
+        if attributes is not None:
+            recipe.update(attributes[pk])
+        recipes.append(recipe)
+    return recipes
+
+
+def invalidate_documents(recipe_ids=None):
+    """
+    Сбрасывает документы перечисленных рецептов новой версией, а без
+    recipe_ids — все сразу, сменой поколения. Старые документы не
+    удаляются, а перестают читаться и истекают сами.
+    """
+    if recipe_ids is None:
+        generation.bump()
+        return
+    versions.bump(recipe_ids)
@@ -0,0 +1,101 @@
+import base64
+import binascii
+from tempfile import SpooledTemporaryFile
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from PIL import Image
+from rest_framework import serializers
+
+from recipes.images import RENDITIONS
+
+ALLOWED_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+DECODE_CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = 1024 * 1024
+
+
+class Base64ImageField(serializers.ImageField):
+    """
+    Картинка в base64. Размер проверяется до декодирования, данные
+    декодируются кусками во временный файл, а число пикселей сверяется
+    по заголовку до распаковки изображения.
+    """
+    default_error_messages = {
+        'invalid_base64': 'Картинка должна быть передана строкой base64.',
+        'too_large': 'Размер картинки не должен превышать {max_bytes} байт.',
+        'too_many_pixels': 'Картинка не должна быть больше '
+                           '{max_pixels} пикселей.',
+        'invalid_format': 'Поддерживаются только JPEG, PNG, GIF и WebP.',
+        'invalid_image': 'Файл повреждён или не является картинкой.',
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail('invalid_base64')
+        # Base64 часто переносят по 76 символов: пробелы и переводы
+        # строк не данные, а validate=True их не пропускает.
+        encoded = ''.join(data.split(';base64,', 1)[-1].split())
+        if len(encoded) // 4 * 3 > settings.IMAGE_MAX_BYTES:
+            self.fail('too_large', max_bytes=settings.IMAGE_MAX_BYTES)
+        file = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        try:
+            for start in range(0, len(encoded), DECODE_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    encoded[start:start + DECODE_CHUNK_SIZE], validate=True
+                ))
+        except (binascii.Error, ValueError):
+            self.fail('invalid_base64')
+        file.seek(0)
+        try:
+            image = Image.open(file)
+        except (OSError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        if image.format not in ALLOWED_FORMATS:
+            self.fail('invalid_format')
+        if image.width * image.height > settings.IMAGE_MAX_PIXELS:
+            self.fail('too_many_pixels', max_pixels=settings.IMAGE_MAX_PIXELS)
+        try:
+            image.verify()
+        except Exception:
+            self.fail('invalid_image')
+        file.seek(0)
+        return File(file, name=f'{uuid4()}.{ALLOWED_FORMATS[image.format]}')
+
+
+class ImageRenditionField(serializers.ReadOnlyField):
+    """
+    Ссылка на уменьшенную копию картинки рецепта или на оригинал,
+    пока копия не готова.
+    """
+
+    def __init__(self, rendition, **kwargs):
+        self.rendition = rendition
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def get_url(self, recipe, rendition):
+        url = default_storage.url(recipe.get_image_rendition(rendition))
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def to_representation(self, recipe):
+        return self.get_url(recipe, self.rendition)
+
+
+class ImageRenditionsField(ImageRenditionField):
+    """
+    Ссылки на все уменьшенные копии картинки рецепта.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(None, **kwargs)
+
+    def to_representation(self, recipe):
+        return {
+            rendition: self.get_url(recipe, rendition)
+            for rendition in RENDITIONS
+        }
@@ -1,14 +1,20 @@
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
 
 from recipes.models import Recipe
+from .search import search_recipes
+from .user_state import get_user_state
+
+# Длинные списки id хуже для планировщика, чем соединение с таблицей.
+MAX_IDS_IN_FILTER = 500
 
 
 class RecipeFilter(FilterSet):
     """
     Фильтры для сортировки рецептов по:
     тегам, автору рецепта (id), нахождению в избранном и списке покупок.
+    Полнотекстовый поиск упорядочивает рецепты по релевантности.
     """
+    search = filters.CharFilter(method='filter_search')
     tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
     author = filters.NumberFilter(field_name='author__id')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
@@ -18,18 +24,30 @@ class RecipeFilter(FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search')
+
+    def filter_by_state(self, queryset, state_name, lookup):
+        ids = getattr(get_user_state(self.request), state_name)
+        if len(ids) > MAX_IDS_IN_FILTER:
+            return queryset.filter(**{lookup: self.request.user})
+        return queryset.filter(id__in=ids.tolist())
 
     def filter_is_favorited(self, queryset, name, value):
         if value:
-            return queryset.filter(favorites__user=self.request.user)
+            return self.filter_by_state(
+                queryset, 'favorites', 'favorites__user'
+            )
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value:
-            return queryset.filter(shopping_cart__user=self.request.user)
+            return self.filter_by_state(
+                queryset, 'cart', 'shopping_cart__user'
+            )
         return queryset
 
-
-class IngredientSearchFilter(SearchFilter):
-    search_param = 'name'
+    def filter_search(self, queryset, name, value):
+        if value.strip():
+            return search_recipes(queryset, value)
+        return queryset
@@ -0,0 +1,268 @@
+import json
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+from functools import partial
+from io import BytesIO
+from tempfile import TemporaryDirectory
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer
+from ..fixtures import get_benchmark_data, get_client, get_recipe_data
+
+FEW_ITERATIONS = 'Для перцентилей нужно минимум две итерации.'
+TABLE_ROW = '{:<36} {:>9} {:>9} {:>8} {:>11}'
+JSON_TABLE_ROW = '{:<28} {:>8} {:>8} {:>8} {:>8} {:>8} {:>6}'
+LARGE_LIMIT = 100
+# Самые большие ответы: на них сравниваются стандартные и orjson-классы
+# рендеринга и разбора JSON.
+JSON_SCENARIOS = ('recipes-list-large', 'ingredients-list',
+                  'subscriptions-large')
+JSON_CLASSES = (
+    ('stdlib', JSONRenderer, JSONParser),
+    ('fast', FastJSONRenderer, FastJSONParser),
+)
+
+
+def parse_json(parser, content):
+    return parser.parse(BytesIO(content))
+
+
+class Command(BaseCommand):
+    """
+    Прогоняет сценарии по всем эндпоинтам api/urls.py через тестовый
+    клиент. Изменения данных откатываются после замера.
+    """
+    help = 'measure API latency, queries and allocations per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--output', default='benchmark.json')
+
+    def get_scenarios(self, data, limit):
+        author, recipe, tag, ingredient = (
+            data.author, data.recipe, data.tag, data.ingredient
+        )
+        recipe_data = get_recipe_data(data)
+        return (
+            (('tags-list', 'get', '/api/tags/', None),),
+            (('tags-detail', 'get', f'/api/tags/{tag.id}/', None),),
+            (('ingredients-list', 'get', '/api/ingredients/', None),),
+            (('ingredients-search', 'get',
+              f'/api/ingredients/?name={ingredient.name[:3]}', None),),
+            (('ingredients-detail', 'get',
+              f'/api/ingredients/{ingredient.id}/', None),),
+            (('recipes-list', 'get', f'/api/recipes/?limit={limit}', None),),
+            (('recipes-list-filtered', 'get',
+              f'/api/recipes/?limit={limit}&tags={tag.slug}'
+              f'&author={author.id}', None),),
+            (('recipes-list-favorited', 'get',
+              f'/api/recipes/?limit={limit}&is_favorited=1', None),),
+            (('recipes-search', 'get',
+              f'/api/recipes/?limit={limit}&search={recipe.name.split()[0]}',
+              None),),
+            (('recipes-pantry', 'get',
+              f'/api/recipes/pantry/?limit={limit}&ingredients='
+              f'{",".join(str(pk) for pk in data.pantry)}', None),),
+            (('recipes-similar', 'get',
+              f'/api/recipes/{recipe.id}/similar/?limit={limit}', None),),
+            (('recipes-recommended', 'get',
+              f'/api/recipes/recommended/?limit={limit}', None),),
+            (('recipes-list-large', 'get',
+              f'/api/recipes/?limit={LARGE_LIMIT}', None),),
+            (('recipes-list-cursor', 'get',
+              f'/api/recipes/?limit={limit}&cursor=', None),),
+            (('recipes-detail', 'get', f'/api/recipes/{recipe.id}/', None),),
+            (('recipes-create', 'post', '/api/recipes/', recipe_data),
+             ('recipes-update', 'patch', '/api/recipes/{id}/', recipe_data),
+             ('recipes-delete', 'delete', '/api/recipes/{id}/', None)),
+            (('recipes-favorite-add', 'post',
+              f'/api/recipes/{recipe.id}/favorite/', None),
+             ('recipes-favorite-remove', 'delete',
+              f'/api/recipes/{recipe.id}/favorite/', None)),
+            (('recipes-shopping-cart-add', 'post',
+              f'/api/recipes/{recipe.id}/shopping_cart/', None),
+             ('recipes-shopping-cart-remove', 'delete',
+              f'/api/recipes/{recipe.id}/shopping_cart/', None)),
+            (('recipes-download-shopping-cart', 'get',
+              '/api/recipes/download_shopping_cart/', None),),
+            (('recipes-shopping-cart-summary', 'get',
+              '/api/recipes/shopping_cart_summary/', None),),
+            (('users-list', 'get', f'/api/users/?limit={limit}', None),),
+            (('users-me', 'get', '/api/users/me/', None),),
+            (('users-detail', 'get', f'/api/users/{author.id}/', None),),
+            (('subscriptions', 'get',
+              f'/api/users/subscriptions/?limit={limit}&recipes_limit=3',
+              None),),
+            (('subscriptions-large', 'get',
+              f'/api/users/subscriptions/?limit={LARGE_LIMIT}', None),),
+            (('subscribe', 'post', f'/api/users/{author.id}/subscribe/',
+              None),
+             ('unsubscribe', 'delete', f'/api/users/{author.id}/subscribe/',
+              None)),
+        )
+
+    @staticmethod
+    def request(client, method, path, data, created_id):
+        path = path.format(id=created_id)
+        response = getattr(client, method)(path, data, format='json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    @staticmethod
+    def get_created_id(response, created_id):
+        data = getattr(response, 'data', None)
+        if response.status_code == 201 and isinstance(data, dict):
+            return data.get('id', created_id)
+        return created_id
+
+    def run_scenarios(self, client, scenarios, iterations):
+        timings = {}
+        for scenario in scenarios:
+            for _ in range(iterations):
+                created_id = None
+                for name, method, path, data in scenario:
+                    started = time.perf_counter()
+                    response = self.request(
+                        client, method, path, data, created_id
+                    )
+                    timings.setdefault(name, []).append(
+                        time.perf_counter() - started
+                    )
+                    if response.status_code >= 400:
+                        raise CommandError(
+                            f'{name}: {response.status_code} '
+                            f'{getattr(response, "content", b"")[:200]}'
+                        )
+                    created_id = self.get_created_id(response, created_id)
+        return timings
+
+    def profile_scenarios(self, client, scenarios):
+        profiles = {}
+        for scenario in scenarios:
+            created_id = None
+            for name, method, path, data in scenario:
+                tracemalloc.start()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.request(
+                        client, method, path, data, created_id
+                    )
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                profiles[name] = {
+                    'status': response.status_code,
+                    'queries': len(queries.captured_queries),
+                    'alloc_peak_kb': round(peak / 1024, 1),
+                }
+                created_id = self.get_created_id(response, created_id)
+        return profiles
+
+    @staticmethod
+    def measure(function, iterations):
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            function()
+            samples.append(time.perf_counter() - started)
+        return round(statistics.median(samples) * 1000, 3)
+
+    def compare_json(self, client, scenarios, iterations):
+        """
+        Медианное время рендеринга и разбора ответов JSON_SCENARIOS
+        стандартными классами DRF и классами на orjson.
+        """
+        results = {}
+        for scenario in scenarios:
+            for name, method, path, data in scenario:
+                if name not in JSON_SCENARIOS:
+                    continue
+                payload = self.request(client, method, path, data, None).data
+                content = JSONRenderer().render(payload)
+                result = {
+                    'size_kb': round(len(content) / 1024, 1),
+                    'identical': FastJSONRenderer().render(payload) == content,
+                }
+                for label, renderer, parser in JSON_CLASSES:
+                    result[f'render_{label}_ms'] = self.measure(
+                        partial(renderer().render, payload), iterations
+                    )
+                    result[f'parse_{label}_ms'] = self.measure(
+                        partial(parse_json, parser(), content), iterations
+                    )
+                results[name] = result
+        return results
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError(FEW_ITERATIONS)
+        data = get_benchmark_data()
+        client = get_client(data.user)
+        scenarios = self.get_scenarios(data, options['limit'])
+        setup_test_environment()
+        try:
+            # Картинки создаваемых рецептов пишутся во временный каталог
+            # и удаляются вместе с ним.
+            with TemporaryDirectory() as media_root, override_settings(
+                MEDIA_ROOT=media_root
+            ), transaction.atomic():
+                self.run_scenarios(client, scenarios, 1)
+                timings = self.run_scenarios(
+                    client, scenarios, options['iterations']
+                )
+                profiles = self.profile_scenarios(client, scenarios)
+                json_results = self.compare_json(
+                    client, scenarios, options['iterations']
+                )
+                transaction.set_rollback(True)
+        finally:
+            teardown_test_environment()
+        results = {}
+        self.stdout.write(TABLE_ROW.format(
+            'endpoint', 'p50, ms', 'p95, ms', 'queries', 'alloc, KB'
+        ))
+        for name, samples in timings.items():
+            quantiles = statistics.quantiles(
+                [sample * 1000 for sample in samples], n=20
+            )
+            results[name] = {
+                'p50_ms': round(statistics.median(samples) * 1000, 3),
+                'p95_ms': round(quantiles[-1], 3),
+                'mean_ms': round(statistics.mean(samples) * 1000, 3),
+                'samples': len(samples),
+                **profiles[name],
+            }
+            self.stdout.write(TABLE_ROW.format(
+                name, results[name]['p50_ms'], results[name]['p95_ms'],
+                results[name]['queries'], results[name]['alloc_peak_kb']
+            ))
+        self.stdout.write(JSON_TABLE_ROW.format(
+            'JSON, медиана в ms', 'KB', 'render', 'orjson', 'parse', 'orjson',
+            'same'
+        ))
+        for name, result in json_results.items():
+            self.stdout.write(JSON_TABLE_ROW.format(
+                name, result['size_kb'], result['render_stdlib_ms'],
+                result['render_fast_ms'], result['parse_stdlib_ms'],
+                result['parse_fast_ms'], str(result['identical'])
+            ))
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump({
+                'created': datetime.now().isoformat(),
+                'database': connection.vendor,
+                'iterations': options['iterations'],
+                'limit': options['limit'],
+                'results': results,
+                'json': json_results,
+            }, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты записаны в {options["output"]}')
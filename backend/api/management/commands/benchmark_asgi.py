@@ -0,0 +1,128 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from foodgram.settings import BASE_DIR
+from ..fixtures import get_benchmark_data
+
+SERVER_START_TIMEOUT = 30
+SERVER_NOT_STARTED = 'Сервер {} не ответил за {} с'
+TABLE_ROW = '{:<6} {:<44} {:>9} {:>9} {:>9} {:>7}'
+# Режим → (приложение, ключи gunicorn, переменные окружения), как
+# в entrypoint.sh run и run-asgi.
+MODES = {
+    'wsgi': ('foodgram.wsgi:application', (), {}),
+    'asgi': ('foodgram.asgi:application',
+             ('--worker-class', 'uvicorn.workers.UvicornWorker'),
+             {'ASYNC_API_VIEWS': '1'}),
+}
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает пропускную способность при одновременных соединениях
+    у синхронных воркеров gunicorn и воркеров uvicorn с асинхронными
+    представлениями. Оба сервера запускаются с текущими настройками
+    и одинаковым числом воркеров, запросы идут от пользователя
+    из seed_benchmark.
+    """
+    help = 'compare concurrent throughput of WSGI and ASGI workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--port', type=int, default=8765)
+
+    @staticmethod
+    def get_paths(data):
+        return (
+            '/api/recipes/?limit=6',
+            f'/api/recipes/{data.recipe.id}/',
+            f'/api/ingredients/?name={data.ingredient.name[:3]}',
+            '/api/recipes/download_shopping_cart/',
+        )
+
+    @staticmethod
+    def start_server(mode, workers, port):
+        application, arguments, environment = MODES[mode]
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', application,
+             f'--bind=127.0.0.1:{port}', f'--workers={workers}',
+             *arguments],
+            cwd=BASE_DIR, env={**os.environ, **environment},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                requests.get(f'http://127.0.0.1:{port}/api/tags/', timeout=1)
+                return server
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(
+            SERVER_NOT_STARTED.format(mode, SERVER_START_TIMEOUT)
+        )
+
+    @staticmethod
+    def load(url, headers, concurrency, count):
+        """
+        count запросов от concurrency одновременных клиентов. Возвращает
+        запросы в секунду, задержки в мс и число ошибок.
+        """
+        def fetch(_):
+            started = time.perf_counter()
+            response = requests.get(url, headers=headers)
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(fetch, range(count)))
+        elapsed = time.perf_counter() - started
+        latencies = [latency * 1000 for latency, _ in results]
+        errors = sum(status >= 400 for _, status in results)
+        return count / elapsed, latencies, errors
+
+    def handle(self, *args, **options):
+        data = get_benchmark_data()
+        token, _ = Token.objects.get_or_create(user=data.user)
+        headers = {'Authorization': f'Token {token.key}'}
+        paths = self.get_paths(data)
+        self.stdout.write(
+            f'Воркеров: {options["workers"]}, одновременных клиентов: '
+            f'{options["concurrency"]}, запросов: {options["requests"]}'
+        )
+        self.stdout.write(TABLE_ROW.format(
+            'mode', 'path', 'req/s', 'p50, ms', 'p95, ms', 'errors'
+        ))
+        for mode in MODES:
+            server = self.start_server(
+                mode, options['workers'], options['port']
+            )
+            try:
+                for path in paths:
+                    url = f'http://127.0.0.1:{options["port"]}{path}'
+                    # Прогрев: кэши и соединения с базой.
+                    self.load(url, headers, options['concurrency'],
+                              options['concurrency'])
+                    rps, latencies, errors = self.load(
+                        url, headers, options['concurrency'],
+                        options['requests']
+                    )
+                    self.stdout.write(TABLE_ROW.format(
+                        mode, path[:44], round(rps, 1),
+                        round(statistics.median(latencies), 1),
+                        round(statistics.quantiles(latencies, n=20)[-1], 1),
+                        errors
+                    ))
+            finally:
+                server.terminate()
+                server.wait()
@@ -0,0 +1,89 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from api.serializers import IngredientSerializer, TagSerializer
+from api.views import IngredientsViewSet, TagsViewSet
+from recipes.models import Ingredient, Tag
+
+NO_INGREDIENTS = ('В базе нет ингредиентов. '
+                  'Сначала выполните: python manage.py load_data')
+TABLE_ROW = '{:<14} {:<16} {:>10} {:>10}'
+
+
+class DatabaseTagsViewSet(ReadOnlyModelViewSet):
+    """
+    Справочник тегов без кэша: запрос к базе и сериализация на каждый
+    запрос, как до появления api/catalog.py.
+    """
+    queryset = Tag.objects.all()
+    serializer_class = TagSerializer
+    pagination_class = None
+
+
+class DatabaseIngredientsViewSet(ReadOnlyModelViewSet):
+    queryset = Ingredient.objects.all()
+    serializer_class = IngredientSerializer
+    pagination_class = None
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает число запросов в секунду к полным спискам тегов
+    и ингредиентов: без кэша, из кэша справочника и с ответом 304
+    на запрос с If-None-Match.
+    """
+    help = 'measure catalog requests per second with and without cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=3)
+
+    @staticmethod
+    def requests_per_second(view, request_factory, seconds):
+        count = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline:
+            response = view(request_factory())
+            if hasattr(response, 'render'):
+                response.render()
+            count += 1
+        return round(count / (time.perf_counter() - started), 1)
+
+    def handle(self, *args, **options):
+        if not Ingredient.objects.exists():
+            raise CommandError(NO_INGREDIENTS)
+        factory = APIRequestFactory()
+        self.stdout.write(TABLE_ROW.format(
+            'catalog', 'mode', 'req/s', 'speedup'
+        ))
+        setup_test_environment()
+        try:
+            for name, path, database_viewset, catalog_viewset in (
+                ('tags', '/api/tags/', DatabaseTagsViewSet, TagsViewSet),
+                ('ingredients', '/api/ingredients/',
+                 DatabaseIngredientsViewSet, IngredientsViewSet),
+            ):
+                catalog_view = catalog_viewset.as_view({'get': 'list'})
+                etag = catalog_view(factory.get(path))['ETag']
+                modes = (
+                    ('database', database_viewset.as_view({'get': 'list'}),
+                     lambda: factory.get(path)),
+                    ('catalog', catalog_view, lambda: factory.get(path)),
+                    ('catalog 304', catalog_view,
+                     lambda: factory.get(path, HTTP_IF_NONE_MATCH=etag)),
+                )
+                baseline = None
+                for mode, view, request_factory in modes:
+                    rps = self.requests_per_second(
+                        view, request_factory, options['seconds']
+                    )
+                    baseline = baseline or rps
+                    self.stdout.write(TABLE_ROW.format(
+                        name, mode, rps, f'×{rps / baseline:.1f}'
+                    ))
+        finally:
+            teardown_test_environment()
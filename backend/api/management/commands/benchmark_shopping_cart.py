@@ -0,0 +1,127 @@
+import statistics
+import time
+import tracemalloc
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api.shopping_list import CACHE_KEY, EXPORT_FORMATS
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart)
+from users.models import User
+from ..fixtures import get_client
+
+CART_SIZES = (10, 100, 1000)
+FEW_ITERATIONS = 'Для медианы нужна хотя бы одна итерация.'
+TABLE_ROW = '{:<6} {:<5} {:>12} {:>12} {:>12} {:>10}'
+DOWNLOAD_URL = '/api/recipes/download_shopping_cart/?format={}'
+
+
+class Command(BaseCommand):
+    """
+    Замеряет выгрузку списка покупок из корзин на 10, 100 и 1000
+    ингредиентов во всех форматах: медиану времени без кэша и из кэша
+    и пик выделенной памяти. Данные создаются и откатываются.
+    """
+    help = 'measure shopping list download latency and memory by cart size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=list(CART_SIZES)
+        )
+
+    @staticmethod
+    def create_cart(size):
+        """
+        Пользователь, в корзине которого один рецепт из size
+        ингредиентов.
+        """
+        run = uuid4().hex[:8]
+        user, author = (User.objects.create_user(
+            username=f'bench-cart-{run}-{role}',
+            email=f'bench-cart-{run}-{role}@benchmark.local',
+            first_name='Бенчмарк', last_name=role
+        ) for role in ('user', 'author'))
+        prefix = f'Бенчмарк {run} '
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'{prefix}{index}', measurement_unit='г')
+            for index in range(size)
+        )
+        recipe = Recipe.objects.create(
+            author=author, name=f'Корзина на {size}',
+            image='recipes/media/benchmark.png', text='Описание',
+            cooking_time=10
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+            for ingredient in Ingredient.objects.filter(
+                name__startswith=prefix
+            )
+        )
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+        return user
+
+    @staticmethod
+    def download(client, export_format):
+        response = client.get(DOWNLOAD_URL.format(export_format))
+        if response.status_code != 200:
+            raise CommandError(
+                f'{export_format}: {response.status_code} '
+                f'{getattr(response, "content", b"")[:200]}'
+            )
+        return b''.join(response.streaming_content)
+
+    def measure(self, user, client, export_format, iterations, cached):
+        samples = []
+        for _ in range(iterations):
+            if not cached:
+                cache.delete(CACHE_KEY.format(user.id))
+            started = time.perf_counter()
+            self.download(client, export_format)
+            samples.append(time.perf_counter() - started)
+        return round(statistics.median(samples) * 1000, 3)
+
+    def peak_memory(self, user, client, export_format):
+        cache.delete(CACHE_KEY.format(user.id))
+        tracemalloc.start()
+        content = self.download(client, export_format)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return round(peak / 1024, 1), len(content)
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError(FEW_ITERATIONS)
+        self.stdout.write(TABLE_ROW.format(
+            'size', 'fmt', 'cold, ms', 'cached, ms', 'peak, KB', 'bytes'
+        ))
+        setup_test_environment()
+        try:
+            with transaction.atomic():
+                for size in options['sizes']:
+                    user = self.create_cart(size)
+                    client = get_client(user)
+                    for export_format in EXPORT_FORMATS:
+                        # Прогрев: шрифт, импорты, первый рендер.
+                        self.download(client, export_format)
+                        cold = self.measure(
+                            user, client, export_format,
+                            options['iterations'], cached=False
+                        )
+                        warm = self.measure(
+                            user, client, export_format,
+                            options['iterations'], cached=True
+                        )
+                        peak, length = self.peak_memory(
+                            user, client, export_format
+                        )
+                        self.stdout.write(TABLE_ROW.format(
+                            size, export_format, cold, warm, peak, length
+                        ))
+                transaction.set_rollback(True)
+        finally:
+            teardown_test_environment()
@@ -0,0 +1,67 @@
+from collections import namedtuple
+
+from django.core.management.base import CommandError
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+NO_DATA = ('Нет данных для замера. '
+           'Сначала выполните: python manage.py seed_benchmark')
+PANTRY_SIZE = 20
+IMAGE = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAf'
+         'FcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==')
+
+BenchmarkData = namedtuple(
+    'BenchmarkData',
+    ('user', 'author', 'recipe', 'tag', 'ingredient', 'pantry')
+)
+
+
+def get_benchmark_data():
+    """
+    Выбирает из сгенерированных seed_benchmark данных пользователя
+    с корзиной и подписками, чужой рецепт и автора, на которого он
+    ещё не подписан.
+    """
+    user = User.objects.filter(
+        shopping_cart__isnull=False, follower__isnull=False
+    ).order_by('id').first()
+    if user is None:
+        raise CommandError(NO_DATA)
+    data = BenchmarkData(
+        user=user,
+        author=User.objects.exclude(id=user.id).exclude(
+            following__user=user
+        ).filter(recipes__isnull=False).first(),
+        recipe=Recipe.objects.exclude(
+            favorites__user=user
+        ).exclude(shopping_cart__user=user).first(),
+        tag=Tag.objects.first(),
+        ingredient=Ingredient.objects.first(),
+        pantry=list(Ingredient.objects.filter(
+            recipe_ingredients__isnull=False
+        ).values_list('id', flat=True).distinct()[:PANTRY_SIZE]),
+    )
+    if None in data:
+        raise CommandError(NO_DATA)
+    return data
+
+
+def get_client(user):
+    token, _ = Token.objects.get_or_create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+def get_recipe_data(data):
+    return {
+        'ingredients': [{'id': data.ingredient.id, 'amount': 10}],
+        'tags': [data.tag.id],
+        'image': IMAGE,
+        'name': 'Рецепт для замера',
+        'text': 'Описание',
+        'cooking_time': 10,
+    }
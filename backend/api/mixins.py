@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+
+from foodgram.db_router import use_primary, use_replica
+
+
+class ReplicaReadMixin:
+    """
+    Читает из реплики для перечисленных действий, если middleware
+    разрешил это запросу. У представлений без action (не ViewSet)
+    GET считается списком.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (getattr(request, 'replica_allowed', False)
+                and getattr(self, 'action', 'list') in self.replica_actions):
+            use_replica()
+
+
+class AnonymousCacheMixin:
+    """
+    Отдаёт анонимным пользователям список и страницу объекта из кэша
+    ответов (api/response_cache.py) с ETag и Cache-Control, чтобы их
+    мог кэшировать и nginx. Ответы авторизованным помечаются private.
+    """
+    response_cache = None
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        """
+        Ответ handler через кэш; представление вызывает этот метод
+        из своих list и retrieve. Last-Modified не отдаётся: у него
+        секундная точность, и после двух изменений за секунду
+        If-Modified-Since получил бы неверный 304.
+        """
+        if request.user.is_authenticated:
+            response = handler(request, *args, **kwargs)
+            patch_cache_control(response, private=True)
+            patch_vary_headers(response, ('Authorization',))
+            return response
+        key = None
+        if request.accepted_renderer.format == 'json':
+            key = self.response_cache.get_key(request)
+        if key is None:
+            return handler(request, *args, **kwargs)
+        generation = self.response_cache.generation.get()
+        etag = self.response_cache.get_etag(generation, key)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            cached = self.response_cache.get(generation, key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                # Реплика может отставать от только что сменившегося
+                # поколения, а ответ будет лежать в кэше под ним.
+                use_primary()
+                response = handler(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                response.add_post_render_callback(
+                    lambda rendered: self.response_cache.set(
+                        generation, key, rendered
+                    )
+                )
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=settings.RESPONSE_CACHE_MAX_AGE
+        )
+        patch_vary_headers(response, ('Authorization',))
+        return response
@@ -0,0 +1,11 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class FileDownloadContentNegotiation(DefaultContentNegotiation):
+    """
+    Не выбирает рендерер по ?format=: в выгрузках этот параметр задаёт
+    формат файла. Ошибки отдаются первым рендерером из списка.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
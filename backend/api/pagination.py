@@ -1,5 +1,39 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Постраничный вывод по курсору: без COUNT(*) и OFFSET.
+    """
+    ordering = '-id'
+    page_size_query_param = 'limit'
 
 
 class LimitPageNumberPagination(PageNumberPagination):
+    """
+    Постраничный вывод по номеру страницы, а при наличии ?cursor= —
+    по курсору. Списки в собственном порядке (по рейтингу, популярности)
+    всегда выводятся по номеру страницы: курсор упорядочивает по id.
+    """
     page_size_query_param = 'limit'
+    cursor_query_param = IdCursorPagination.cursor_query_param
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = IdCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def paginate_ranked(self, ranked, request, view=None):
+        self.cursor_paginator = None
+        return super().paginate_queryset(ranked, request, view)
@@ -0,0 +1,77 @@
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from foodgram.db_router import PRIMARY_DATABASE
+from recipes.models import RecipeIngredient
+from .cache import ProcessIndex
+
+TYPECODE = 'q'
+MAX_PANTRY_SIZE = 100
+
+
+class PantryIndex(ProcessIndex):
+    """
+    Обратный индекс «ингредиент → рецепты» в виде отсортированных
+    массивов id. Покрытие рецепта — доля его ингредиентов, которые
+    есть у пользователя.
+    """
+
+    def __init__(self):
+        super().__init__('pantry')
+        self._postings = defaultdict(lambda: array(TYPECODE))
+        self._ingredients = {}
+
+    def clear(self):
+        self._postings.clear()
+        self._ingredients.clear()
+
+    def add(self, recipe_ids=None):
+        rows = RecipeIngredient.objects.using(PRIMARY_DATABASE)
+        if recipe_ids is not None:
+            rows = rows.filter(recipe_id__in=recipe_ids)
+        ingredients = defaultdict(list)
+        for recipe_id, ingredient_id in rows.order_by(
+            'recipe_id'
+        ).values_list('recipe_id', 'ingredient_id').iterator():
+            ingredients[recipe_id].append(ingredient_id)
+        for recipe_id, ingredient_ids in ingredients.items():
+            for ingredient_id in ingredient_ids:
+                postings = self._postings[ingredient_id]
+                if recipe_ids is None:
+                    postings.append(recipe_id)
+                else:
+                    insort(postings, recipe_id)
+            self._ingredients[recipe_id] = array(TYPECODE, ingredient_ids)
+
+    def remove(self, recipe_id):
+        for ingredient_id in self._ingredients.pop(recipe_id, ()):
+            postings = self._postings[ingredient_id]
+            index = bisect_left(postings, recipe_id)
+            if index < len(postings) and postings[index] == recipe_id:
+                postings.pop(index)
+            if not postings:
+                del self._postings[ingredient_id]
+
+    def match(self, ingredient_ids):
+        """
+        Рецепты, в которых есть хотя бы один из ингредиентов, в виде
+        (id, покрытие, число совпавших ингредиентов) — сначала
+        с наибольшим покрытием.
+        """
+        self.refresh()
+        matched = Counter()
+        with self._lock:
+            for ingredient_id in set(ingredient_ids):
+                postings = self._postings.get(ingredient_id)
+                if postings:
+                    matched.update(postings)
+            results = [
+                (recipe_id, count / len(self._ingredients[recipe_id]), count)
+                for recipe_id, count in matched.items()
+            ]
+        results.sort(key=lambda result: (-result[1], -result[2], -result[0]))
+        return results
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,37 @@
+from django.db.models import Sum
+
+from recipes.models import SimilarRecipe
+
+MAX_SEEDS = 200
+MAX_CANDIDATES = 500
+
+
+def get_similar(recipe_id):
+    """
+    Готовый список соседей рецепта, посчитанный командой
+    update_similar_recipes.
+    """
+    return list(SimilarRecipe.objects.filter(
+        recipe_id=recipe_id
+    ).order_by('-score').values_list('similar_id', 'score'))
+
+
+def get_recommended(state):
+    """
+    Соседи последних рецептов из избранного и корзины пользователя,
+    кроме уже добавленных, по сумме сходства.
+    """
+    seen = set(state.favorites) | set(state.cart)
+    seeds = sorted(seen)[-MAX_SEEDS:]
+    if not seeds:
+        return []
+    candidates = SimilarRecipe.objects.filter(
+        recipe_id__in=seeds
+    ).exclude(similar_id__in=seeds).values('similar_id').annotate(
+        total=Sum('score')
+    ).order_by('-total', '-similar_id').values_list('similar_id', 'total')
+    return [
+        (recipe_id, score)
+        for recipe_id, score in candidates[:MAX_CANDIDATES]
+        if recipe_id not in seen
+    ]
@@ -0,0 +1,68 @@
+import re
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Числа, которые orjson записывает иначе, чем json: экспонента
+# (1e-7 вместо 1e-07, 1e17 вместо 1e+17) и малые дроби без неё
+# (0.00001 вместо 1e-05). Поиск начинается с литерала — так он в разы
+# быстрее, — а начало числа проверяется только у найденных кандидатов.
+# Совпадение внутри строки лишь отправляет ответ по медленному пути.
+EXPONENT = re.compile(rb'e-?\d+(?:[,\]}]|\Z)')
+MANTISSA = re.compile(rb'(?:[:,\[]|\A)-?\d+(?:\.\d+)?\Z')
+MANTISSA_WINDOW = 32
+SMALL_DECIMAL = re.compile(rb'0\.0000\d')
+NUMBER_START = re.compile(rb'(?:[:,\[]|\A)-?\Z')
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS
+    | orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_PASSTHROUGH_DATACLASS
+) if orjson is not None else None
+
+
+def differs_from_json(content):
+    for match in EXPONENT.finditer(content):
+        start = match.start()
+        if MANTISSA.search(content, max(start - MANTISSA_WINDOW, 0), start):
+            return True
+    for match in SMALL_DECIMAL.finditer(content):
+        start = match.start()
+        if NUMBER_START.search(content, max(start - 2, 0), start):
+            return True
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson: те же байты, что у стандартного, но быстрее
+    на больших страницах. Без orjson, с отступами (например,
+    в браузерном API) и в редких случаях, где вывод orjson отличается,
+    работает стандартный рендерер. NaN и бесконечность orjson пишет
+    как null, а не отвергает: в ответах API таких чисел нет.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii
+                or not self.compact or self.get_indent(
+                    accepted_media_type, renderer_context or {}
+                ) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # Даты и прочие типы, которых нет в JSON, — через кодировщик
+            # DRF: у orjson другой формат дат.
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=ORJSON_OPTIONS
+            )
+        except orjson.JSONEncodeError:
+            # Например, целые шире 64 бит.
+            ret = None
+        if ret is None or differs_from_json(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(
+            b'\xe2\x80\xa8', b'\\u2028'
+        ).replace(b'\xe2\x80\xa9', b'\\u2029')
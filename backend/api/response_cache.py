@@ -0,0 +1,66 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import quote_etag, urlencode
+
+from .cache import CacheGeneration
+
+# Параметры, от которых зависит ответ анонимному пользователю. Запросы
+# с другими параметрами не кэшируются, чтобы случайные строки запроса
+# не раздували кэш.
+CACHED_PARAMS = frozenset(('tags', 'author', 'page', 'limit', 'search'))
+
+
+class ResponseCache:
+    """
+    Готовые JSON-ответы анонимным пользователям. Ключ содержит поколение
+    данных: после изменения рецептов старые ответы просто перестают
+    находиться и вытесняются по таймауту.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.generation = CacheGeneration(f'response:{name}:generation')
+
+    @staticmethod
+    def normalize_query(query_params):
+        """
+        Строка запроса с отсортированными параметрами и значениями или
+        None, если в ней есть параметры вне CACHED_PARAMS.
+        """
+        if not CACHED_PARAMS.issuperset(query_params):
+            return None
+        return urlencode(sorted(
+            (name, value)
+            for name in query_params
+            for value in query_params.getlist(name)
+        ))
+
+    def get_key(self, request):
+        query = self.normalize_query(request.query_params)
+        if query is None:
+            return None
+        # Хост и путь входят в ключ: от них зависят ссылки пагинации.
+        return md5(
+            f'{request.build_absolute_uri(request.path)}?{query}'.encode()
+        ).hexdigest()
+
+    def get_etag(self, generation, key):
+        return quote_etag(f'{self.name}-{generation}-{key}')
+
+    def get(self, generation, key):
+        return cache.get(f'response:{self.name}:{generation}:{key}')
+
+    def set(self, generation, key, response):
+        cache.set(
+            f'response:{self.name}:{generation}:{key}',
+            (response.content, response['Content-Type']),
+            timeout=settings.RESPONSE_CACHE_TIMEOUT
+        )
+
+    def invalidate(self):
+        self.generation.bump()
+
+
+recipes_response_cache = ResponseCache('recipes')
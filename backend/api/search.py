@@ -0,0 +1,188 @@
+import re
+from collections import defaultdict
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections
+from django.db.models import Case, F, OuterRef, Subquery, When
+
+from foodgram.db_router import PRIMARY_DATABASE
+from recipes.models import Recipe, RecipeIngredient
+from .autocomplete import normalize
+from .cache import ProcessIndex
+
+SEARCH_CONFIG = 'russian'
+# Веса как у ts_rank для A, B и C: название, ингредиенты, описание.
+WEIGHTS = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+FALLBACK_LIMIT = 1000
+MIN_STEM_LENGTH = 3
+STOP_WORDS = frozenset((
+    'и', 'в', 'во', 'на', 'с', 'со', 'к', 'ко', 'по', 'из', 'от', 'до',
+    'для', 'без', 'под', 'над', 'о', 'об', 'а', 'но', 'или', 'не', 'же',
+))
+ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ей', 'ом', 'ем',
+    'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ия', 'ью', 'ь', 'а', 'я', 'о',
+    'е', 'ы', 'и', 'у', 'ю', 'й',
+), key=len, reverse=True)
+WORD = re.compile(r'\w+')
+
+
+def stem(word):
+    """
+    Упрощённый русский стеммер: отрезает самое длинное окончание,
+    оставляя основу не короче MIN_STEM_LENGTH.
+    """
+    for ending in ENDINGS:
+        if (word.endswith(ending)
+                and len(word) - len(ending) >= MIN_STEM_LENGTH):
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    return [
+        stem(word) for word in WORD.findall(normalize(text))
+        if word not in STOP_WORDS
+    ]
+
+
+def is_postgres(alias):
+    return connections[alias].vendor == 'postgresql'
+
+
+def get_ingredient_names(recipe_ids):
+    names = defaultdict(list)
+    for recipe_id, name in RecipeIngredient.objects.using(
+        PRIMARY_DATABASE
+    ).filter(recipe_id__in=recipe_ids).values_list(
+        'recipe_id', 'ingredient__name'
+    ):
+        names[recipe_id].append(name)
+    return {
+        recipe_id: ' '.join(recipe_names)
+        for recipe_id, recipe_names in names.items()
+    }
+
+
+class RecipeSearchIndex(ProcessIndex):
+    """
+    Обратный индекс рецептов для баз без полнотекстового поиска
+    (SQLite в тестах и локально).
+    """
+
+    def __init__(self):
+        super().__init__('search')
+        self._postings = defaultdict(dict)
+        self._terms = {}
+
+    def clear(self):
+        self._postings.clear()
+        self._terms.clear()
+
+    def add(self, recipe_ids=None):
+        recipes = Recipe.objects.using(PRIMARY_DATABASE)
+        if recipe_ids is not None:
+            recipes = recipes.filter(id__in=recipe_ids)
+        recipes = list(recipes.values_list('id', 'name', 'text'))
+        ingredients = get_ingredient_names([pk for pk, _, _ in recipes])
+        for recipe_id, name, text in recipes:
+            fields = {
+                'name': name,
+                'ingredients': ingredients.get(recipe_id, ''),
+                'text': text,
+            }
+            weights = defaultdict(float)
+            for field, value in fields.items():
+                for term in tokenize(value):
+                    weights[term] += WEIGHTS[field]
+            for term, weight in weights.items():
+                self._postings[term][recipe_id] = weight
+            self._terms[recipe_id] = tuple(weights)
+
+    def remove(self, recipe_id):
+        for term in self._terms.pop(recipe_id, ()):
+            postings = self._postings[term]
+            postings.pop(recipe_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query, limit=FALLBACK_LIMIT):
+        """
+        id рецептов, содержащих все слова запроса, по убыванию веса.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        self.refresh()
+        with self._lock:
+            postings = sorted(
+                (self._postings.get(term, {}) for term in terms), key=len
+            )
+            scores = {
+                recipe_id: sum(posting[recipe_id] for posting in postings)
+                for recipe_id in postings[0]
+                if all(recipe_id in posting for posting in postings[1:])
+            }
+        return sorted(
+            scores, key=lambda recipe_id: (-scores[recipe_id], -recipe_id)
+        )[:limit]
+
+
+recipe_search_index = RecipeSearchIndex()
+
+
+def update_search_vectors(recipe_ids=None):
+    """
+    Пересчитывает search_vector одним UPDATE для перечисленных рецептов
+    или для всех.
+    """
+    recipes = Recipe.objects.all()
+    if recipe_ids is not None:
+        recipes = recipes.filter(id__in=recipe_ids)
+    ingredient_names = RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk')
+    ).order_by().values('recipe').annotate(
+        names=StringAgg('ingredient__name', ' ')
+    ).values('names')
+    recipes.update(search_vector=(
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(
+            Subquery(ingredient_names), weight='B', config=SEARCH_CONFIG
+        )
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    ))
+
+
+def index_recipes(recipe_ids=None, deleted=False):
+    """
+    Обновляет поисковый индекс после изменения рецептов (без recipe_ids —
+    всех): в PostgreSQL — столбец search_vector, иначе — индекс в памяти.
+    """
+    if is_postgres(PRIMARY_DATABASE):
+        if not deleted:
+            update_search_vectors(recipe_ids)
+    elif recipe_ids is None:
+        recipe_search_index.invalidate()
+    else:
+        recipe_search_index.update(recipe_ids)
+
+
+def search_recipes(queryset, query):
+    """
+    Оставляет рецепты, подходящие под запрос, упорядочив их по
+    релевантности.
+    """
+    if is_postgres(queryset.db):
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        return queryset.annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).filter(search_vector=search_query).order_by('-search_rank', '-id')
+    recipe_ids = recipe_search_index.search(query)
+    return queryset.filter(id__in=recipe_ids).order_by(Case(
+        *(When(id=recipe_id, then=position)
+          for position, recipe_id in enumerate(recipe_ids)),
+        default=len(recipe_ids)
+    ))
@@ -1,9 +1,13 @@
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from recipes.cart import rebuild_recipe_carts
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
-from users.models import Follow, User
+from users.models import User
+from .fields import (Base64ImageField, ImageRenditionField,
+                     ImageRenditionsField)
+from .user_state import get_user_state
 
 
 NEED_INGREDIENTS = 'Добавьте минимум один ингредиент!'
@@ -12,6 +16,7 @@ AMOUNT_INGREDIENTS = 'Количество ингредиента должно 
 NEED_TAGS = 'Добавьте минимум один тег!'
 UNIQUE_TAGS = 'Теги должны быть уникальными!'
 UNIQUE_FAVORITE_RECIPE = 'Данный рецепт был добавлен ранее.'
+RECIPES_LIMIT = 'Укажите целое неотрицательное число.'
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -46,10 +51,28 @@ class CustomUserSerializer(UserSerializer):
                   'first_name', 'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=user, author=obj.id).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return get_user_state(self.context.get('request')).contains(
+            'following', obj.id
+        )
+
+
+def get_recipes_limit(request):
+    """
+    Число рецептов автора из ?recipes_limit= или None, если параметр
+    не передан. На нечисловое и отрицательное значение — ошибка 400.
+    """
+    value = request.query_params.get('recipes_limit')
+    if not value:
+        return None
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = -1
+    if limit < 0:
+        raise serializers.ValidationError({'recipes_limit': RECIPES_LIMIT})
+    return limit
 
 
 class FollowSerializer(CustomUserSerializer):
@@ -57,7 +80,6 @@ class FollowSerializer(CustomUserSerializer):
     Вывод подписок пользователя.
     """
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -65,16 +87,13 @@ class FollowSerializer(CustomUserSerializer):
                   'first_name', 'last_name', 'is_subscribed',
                   'recipes', 'recipes_count')
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
     def get_recipes(self, obj):
-        recipes = obj.recipes.all()
-        recipes_limit = (self.context.get('request')
-                         .query_params.get('recipes_limit')
-                         )
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(obj, 'latest_recipes'):
+            return MinimumRecipeSerializer(obj.latest_recipes, many=True).data
+        recipes = obj.recipes.order_by('-id')
+        recipes_limit = get_recipes_limit(self.context.get('request'))
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
         return MinimumRecipeSerializer(recipes, many=True).data
 
 
@@ -120,24 +139,44 @@ class RecipeGetSerializer(serializers.ModelSerializer):
         )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image = ImageRenditionField('card')
+    images = ImageRenditionsField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time')
+                  'name', 'image', 'images', 'text', 'cooking_time')
+
+    def get_is_favorited(self, obj):
+        return get_user_state(self.context.get('request')).contains(
+            'favorites', obj.id
+        )
+
+    def get_is_in_shopping_cart(self, obj):
+        return get_user_state(self.context.get('request')).contains(
+            'cart', obj.id
+        )
+
+
+class AuthorDocumentSerializer(CustomUserSerializer):
+
+    def get_is_subscribed(self, obj):
+        return False
+
+
+class RecipeDocumentSerializer(RecipeGetSerializer):
+    """
+    Рецепт без признаков пользователя и с относительными ссылками
+    на картинки: общий для всех документ в кэше (api/documents.py).
+    """
+    author = AuthorDocumentSerializer(read_only=True)
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        return (user.is_authenticated
-                and Recipe.objects.filter(favorites__user=user, id=obj.id)
-                .exists())
+        return False
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        return (user.is_authenticated
-                and Recipe.objects.filter(shopping_cart__user=user, id=obj.id)
-                .exists())
+        return False
 
 
 class AddIngredientSerializer(serializers.ModelSerializer):
@@ -167,8 +206,7 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def create_tags(tags, recipe):
-        for tag in tags:
-            recipe.tags.add(tag)
+        recipe.tags.set(tags)
 
     @staticmethod
     def create_ingredients(ingredients, recipe):
@@ -178,6 +216,37 @@ class RecipeSerializer(serializers.ModelSerializer):
             amount=ingredient['amount']
             ) for ingredient in ingredients])
 
+    @staticmethod
+    def update_ingredients(ingredients, recipe):
+        """
+        Удаляет, добавляет и меняет только те строки ингредиентов,
+        которые отличаются от сохранённых, и пересчитывает сводки
+        корзин с этим рецептом.
+        """
+        amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed, changed = [], []
+        for recipe_ingredient in recipe.recipe_ingredients.all():
+            amount = amounts.pop(recipe_ingredient.ingredient_id, None)
+            if amount is None:
+                removed.append(recipe_ingredient.id)
+            elif amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if removed:
+            RecipeIngredient.objects.filter(id__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if amounts:
+            RecipeIngredient.objects.bulk_create([RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            ) for ingredient_id, amount in amounts.items()])
+        if removed or changed or amounts:
+            rebuild_recipe_carts(recipe.id)
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -193,11 +262,10 @@ class RecipeSerializer(serializers.ModelSerializer):
             instance, context={'request': self.context.get('request')}
         ).data
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        RecipeIngredient.objects.filter(recipe=instance).delete()
         self.create_tags(validated_data.pop('tags'), instance)
-        self.create_ingredients(validated_data.pop('ingredients'), instance)
+        self.update_ingredients(validated_data.pop('ingredients'), instance)
         return super().update(instance, validated_data)
 
     def validate(self, data):
@@ -232,6 +300,8 @@ class MinimumRecipeSerializer(serializers.ModelSerializer):
     """
     Краткое отображение рецептов.
     """
+    image = ImageRenditionField('thumbnail')
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
@@ -0,0 +1,168 @@
+import csv
+import json
+from collections import namedtuple
+from functools import lru_cache
+from hashlib import md5
+from io import BytesIO
+from os import path
+
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from foodgram.settings import BASE_DIR
+from recipes.cart import from_base
+from recipes.models import ShoppingCartSummary
+
+
+DOCUMENT_TITLE = 'Foodgram, «Продуктовый помощник»'
+PAGE_TITLE = 'Список покупок'
+FILENAME = 'shopping_cart.{}'
+DEFAULT_FORMAT = 'pdf'
+CSV_HEADER = ('name', 'measurement_unit', 'amount')
+FONT_NAME = 'lobster'
+FONT_PATH = path.join(BASE_DIR, f'data/{FONT_NAME}.ttf')
+SHOPPING_CART_TEMPLATE = '• {} ({}) - {}'
+TITLE_FONT_SIZE = 32
+LINE_FONT_SIZE = 18
+FIRST_LINE_HEIGHT = 750
+TOP_LINE_HEIGHT = 800
+BOTTOM_MARGIN = 50
+LINE_SPACING = 25
+CACHE_KEY = 'shopping-list:pdf:{}'
+CACHE_TIMEOUT = 60 * 60 * 24
+CHUNK_SIZE = 64 * 1024
+
+ExportFormat = namedtuple('ExportFormat', ('content_type', 'writer'))
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    """
+    Регистрирует шрифт один раз на процесс.
+    """
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH, 'UTF-8'))
+
+
+def get_shopping_list(user):
+    """
+    Читает сводку корзины в список кортежей (название, единица
+    измерения, количество), общий для всех форматов.
+    """
+    return [
+        (name, *from_base(unit, amount))
+        for name, unit, amount in ShoppingCartSummary.objects.filter(
+            user=user
+        ).order_by('name', 'measurement_unit').values_list(
+            'name', 'measurement_unit', 'amount'
+        )
+    ]
+
+
+def get_version(shopping_list):
+    return md5(repr(shopping_list).encode()).hexdigest()
+
+
+def render_pdf(shopping_list):
+    """
+    Рисует список покупок, перенося строки на новые страницы.
+    """
+    register_font()
+    buffer = BytesIO()
+    pdf_doc = canvas.Canvas(buffer)
+    pdf_doc.setTitle(DOCUMENT_TITLE)
+    pdf_doc.setFont(FONT_NAME, size=TITLE_FONT_SIZE)
+    pdf_doc.drawCentredString(300, 800, PAGE_TITLE)
+    pdf_doc.line(100, 780, 480, 780)
+    pdf_doc.setFont(FONT_NAME, size=LINE_FONT_SIZE)
+    height = FIRST_LINE_HEIGHT
+    for ingredient in shopping_list:
+        if height < BOTTOM_MARGIN:
+            pdf_doc.showPage()
+            pdf_doc.setFont(FONT_NAME, size=LINE_FONT_SIZE)
+            height = TOP_LINE_HEIGHT
+        pdf_doc.drawString(
+            75, height, SHOPPING_CART_TEMPLATE.format(*ingredient)
+        )
+        height -= LINE_SPACING
+    pdf_doc.showPage()
+    pdf_doc.save()
+    return buffer.getvalue()
+
+
+def get_document(user, shopping_list):
+    """
+    Возвращает PDF из кэша, если содержимое корзины не изменилось
+    с момента последней выгрузки.
+    """
+    version = get_version(shopping_list)
+    key = CACHE_KEY.format(user.id)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    document = render_pdf(shopping_list)
+    cache.set(key, (version, document), CACHE_TIMEOUT)
+    return document
+
+
+def iter_chunks(document):
+    for start in range(0, len(document), CHUNK_SIZE):
+        yield document[start:start + CHUNK_SIZE]
+
+
+def write_pdf(user, shopping_list):
+    return iter_chunks(get_document(user, shopping_list))
+
+
+def write_txt(user, shopping_list):
+    yield f'{PAGE_TITLE}\n\n'
+    for ingredient in shopping_list:
+        yield SHOPPING_CART_TEMPLATE.format(*ingredient) + '\n'
+
+
+class Echo:
+    """
+    Псевдобуфер для csv.writer: возвращает строку вместо записи.
+    """
+
+    def write(self, value):
+        return value
+
+
+def write_csv(user, shopping_list):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for ingredient in shopping_list:
+        yield writer.writerow(ingredient)
+
+
+def write_json(user, shopping_list):
+    yield '['
+    for index, ingredient in enumerate(shopping_list):
+        if index:
+            yield ','
+        yield json.dumps(
+            dict(zip(CSV_HEADER, ingredient)), ensure_ascii=False
+        )
+    yield ']'
+
+
+EXPORT_FORMATS = {
+    'pdf': ExportFormat('application/pdf', write_pdf),
+    'txt': ExportFormat('text/plain; charset=utf-8', write_txt),
+    'csv': ExportFormat('text/csv; charset=utf-8', write_csv),
+    'json': ExportFormat('application/json', write_json),
+}
+
+
+def shopping_list_response(user, export_format=DEFAULT_FORMAT):
+    content_type, writer = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(
+        writer(user, get_shopping_list(user)), content_type=content_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{FILENAME.format(export_format)}"'
+    )
+    return response
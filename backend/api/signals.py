@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.images import renditions_built
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+from .catalog import ingredients_catalog, tags_catalog
+from .documents import invalidate_documents
+from .pantry import pantry_index
+from .response_cache import recipes_response_cache
+from .search import index_recipes
+from .user_state import invalidate_user_state
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    transaction.on_commit(tags_catalog.invalidate)
+    transaction.on_commit(invalidate_documents)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    transaction.on_commit(ingredients_catalog.invalidate)
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(instance, created, **kwargs):
+    if not created:
+        recipe_ids = list(RecipeIngredient.objects.filter(
+            ingredient=instance
+        ).values_list('recipe_id', flat=True))
+        if recipe_ids:
+            transaction.on_commit(
+                lambda: refresh_ingredient_recipes(recipe_ids)
+            )
+
+
+def refresh_ingredient_recipes(recipe_ids):
+    index_recipes(recipe_ids)
+    invalidate_documents(recipe_ids)
+
+
+def reindex_recipes(recipe_ids, deleted=False):
+    index_recipes(recipe_ids, deleted)
+    pantry_index.update(recipe_ids)
+    invalidate_documents(recipe_ids)
+
+
+@receiver(renditions_built)
+def refresh_recipe_images(recipe_id, **kwargs):
+    invalidate_documents([recipe_id])
+    recipes_response_cache.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+def reindex_recipe(instance, **kwargs):
+    recipe_id = instance.id
+    transaction.on_commit(lambda: reindex_recipes([recipe_id]))
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(instance, **kwargs):
+    recipe_id = instance.id
+    transaction.on_commit(
+        lambda: reindex_recipes([recipe_id], deleted=True)
+    )
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Follow)
+def invalidate_state(instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_user_state(user_id))
+
+
+# Теги и ингредиенты рецепта меняются только вместе с сохранением
+# самого рецепта (api/serializers.py, карточка рецепта в админке),
+# поэтому обработчики на каждую строку не нужны: они размножили бы
+# сбросы кэшей, а m2m_changed ещё и лишил бы tags.set() быстрой вставки.
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_recipe_responses(**kwargs):
+    transaction.on_commit(recipes_response_cache.invalidate)
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_author_responses(instance, update_fields=None, **kwargs):
+    # Вход пользователя обновляет только last_login: в рецептах его нет.
+    if update_fields == frozenset(('last_login',)):
+        return
+    transaction.on_commit(recipes_response_cache.invalidate)
+    recipe_ids = list(Recipe.objects.filter(
+        author_id=instance.id
+    ).values_list('id', flat=True))
+    if recipe_ids:
+        transaction.on_commit(lambda: invalidate_documents(recipe_ids))
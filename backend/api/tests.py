@@ -0,0 +1,1254 @@
+import asyncio
+import re
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+from base64 import b64decode
+from collections import Counter
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from io import BytesIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from foodgram.db_router import (PRIMARY_DATABASE, STICKY_COOKIE,
+                                PrimaryReplicaRouter, ReplicaRoutingMiddleware,
+                                use_primary, use_replica)
+from foodgram.settings import BASE_DIR
+from foodgram.metrics import MetricsMiddleware, registry
+from recipes import cart
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingCartSummary, SimilarRecipe,
+                            Tag)
+from users.models import Follow, User
+from . import documents, urls
+from .fields import Base64ImageField
+from .management.fixtures import IMAGE, get_client
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer, orjson
+from .pantry import PantryIndex
+from .user_state import UserState, get_user_state, invalidate_user_state
+
+SMALL_PAGE = 2
+LARGE_PAGE = 10
+AUTHORS = 3
+RECIPES_PER_AUTHOR = 5
+REPLICA = 'replica_test'
+# Строка плана с полным просмотром таблицы.
+SEQUENTIAL_SCANS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)'),
+}
+
+# Число SQL-запросов на маршрут api/urls.py на данных FoodgramTestCase
+# в SQLite на холодных кэшах, с аутентификацией по токену (первый
+# запрос в каждом). Для маршрута берётся худший из его запросов
+# в BUDGET_REQUESTS. Холодный кэш добавляет признаки пользователя
+# (избранное, корзина и подписки — три запроса), документы рецептов
+# (рецепты, теги, авторы и ингредиенты — четыре), загрузку справочника
+# и построение индекса в памяти процесса.
+BUDGETS = {
+    # Справочник целиком.
+    'tags-list': 2,
+    'tags-detail': 2,
+    'ingredients-list': 2,
+    'ingredients-detail': 2,
+    # Создание: тег, ингредиент, точка сохранения, рецепт, счётчик
+    # автора, теги, ингредиенты, признаки пользователя и теги
+    # с ингредиентами для ответа.
+    'recipes-list': 16,
+    # Изменение: то же плюс варианты фильтра по тегам, рецепт с автором
+    # для проверки прав и текущие ингредиенты для разницы.
+    'recipes-detail': 17,
+    # Проверка дубля, рецепт, запись и счётчик рецепта.
+    'recipes-favorite': 5,
+    # То же плюс строки рецепта и пересчёт сводки корзины.
+    'recipes-shopping-cart': 9,
+    # Готовая сводка корзины.
+    'recipes-download-shopping-cart': 2,
+    'recipes-shopping-cart-summary': 2,
+    # Индекс, признаки пользователя и документы.
+    'recipes-pantry': 9,
+    # Рецепт и его соседи, признаки пользователя и документы.
+    'recipes-similar': 10,
+    # Признаки пользователя, соседи избранного и корзины одним
+    # запросом и документы.
+    'recipes-recommended': 9,
+    # COUNT(*), страница и признаки пользователя для is_subscribed.
+    'users-list': 6,
+    'users-me': 4,
+    'users-detail': 5,
+    # COUNT(*), страница авторов и их последние рецепты одним запросом.
+    'subscriptions': 4,
+    # Проверка подписки, автор, запись, признаки пользователя
+    # и рецепты автора для ответа.
+    'subscribe': 8,
+}
+# Запас на различия баз: в PostgreSQL при записи рецепта добавляются
+# обновление search_vector и другие точки сохранения. Запрос на каждую
+# строку страницы ловит не бюджет, а сравнение двух размеров страницы.
+QUERY_HEADROOM = 2
+# Бюджеты чтения на прогретых кэшах: проверяют, что кэши вообще
+# работают. Различий между базами здесь нет, поэтому и запаса нет.
+WARM_BUDGETS = {
+    'tags-list': 1,
+    'tags-detail': 1,
+    'ingredients-list': 1,
+    'ingredients-detail': 1,
+    # Варианты фильтра по тегам (дважды с ?tags=), COUNT(*) и id
+    # страницы.
+    'recipes-list': 5,
+    # Варианты фильтра по тегам и рецепт для get_object().
+    'recipes-detail': 3,
+    'recipes-download-shopping-cart': 2,
+    'recipes-shopping-cart-summary': 2,
+    'recipes-pantry': 1,
+    'recipes-similar': 3,
+    'recipes-recommended': 2,
+    'users-list': 3,
+    'users-me': 1,
+    'users-detail': 2,
+    'subscriptions': 4,
+}
+DJOSER_DUPLICATE = 'дубль маршрута users-* из djoser.urls'
+NEEDS_EMAIL = 'требует ссылки из письма или смены учётных данных'
+UNCHECKED = {
+    'api-root': 'служебная страница DRF',
+    'login': NEEDS_EMAIL,
+    'logout': NEEDS_EMAIL,
+    'users-activation': NEEDS_EMAIL,
+    'users-resend-activation': NEEDS_EMAIL,
+    'users-reset-password': NEEDS_EMAIL,
+    'users-reset-password-confirm': NEEDS_EMAIL,
+    'users-reset-username': NEEDS_EMAIL,
+    'users-reset-username-confirm': NEEDS_EMAIL,
+    'users-set-password': NEEDS_EMAIL,
+    'users-set-username': NEEDS_EMAIL,
+    **{name: DJOSER_DUPLICATE for name in (
+        'user-list', 'user-activation', 'user-me', 'user-resend-activation',
+        'user-reset-password', 'user-reset-password-confirm',
+        'user-reset-username', 'user-reset-username-confirm',
+        'user-set-password', 'user-set-username', 'user-detail',
+    )},
+}
+# Маршрут, метод, путь и тело в порядке выполнения: запросы меняют
+# данные для следующих. Пути с {limit} проверяются на двух размерах
+# страницы: число запросов не должно от него зависеть.
+BUDGET_REQUESTS = (
+    ('tags-list', 'get', '/api/tags/', False),
+    ('tags-detail', 'get', '/api/tags/{tag}/', False),
+    ('ingredients-list', 'get', '/api/ingredients/?name={ingredient}', False),
+    ('ingredients-detail', 'get', '/api/ingredients/{ingredient_id}/',
+     False),
+    ('recipes-list', 'get', '/api/recipes/?limit={limit}', False),
+    ('recipes-list', 'get',
+     '/api/recipes/?limit={limit}&is_favorited=1&tags={tag_slug}', False),
+    ('recipes-list', 'get', '/api/recipes/?limit={limit}&search={word}',
+     False),
+    ('recipes-list', 'post', '/api/recipes/', True),
+    ('recipes-detail', 'get', '/api/recipes/{recipe}/', False),
+    ('recipes-detail', 'patch', '/api/recipes/{created}/', True),
+    ('recipes-detail', 'delete', '/api/recipes/{created}/', False),
+    ('recipes-favorite', 'post', '/api/recipes/{recipe}/favorite/', False),
+    ('recipes-favorite', 'delete', '/api/recipes/{recipe}/favorite/', False),
+    ('recipes-shopping-cart', 'post',
+     '/api/recipes/{recipe}/shopping_cart/', False),
+    ('recipes-shopping-cart', 'delete',
+     '/api/recipes/{recipe}/shopping_cart/', False),
+    ('recipes-download-shopping-cart', 'get',
+     '/api/recipes/download_shopping_cart/?format=txt', False),
+    ('recipes-shopping-cart-summary', 'get',
+     '/api/recipes/shopping_cart_summary/', False),
+    ('recipes-pantry', 'get',
+     '/api/recipes/pantry/?limit={limit}&ingredients={pantry}', False),
+    ('recipes-similar', 'get',
+     '/api/recipes/{recipe}/similar/?limit={limit}', False),
+    ('recipes-recommended', 'get',
+     '/api/recipes/recommended/?limit={limit}', False),
+    ('users-list', 'get', '/api/users/?limit={limit}', False),
+    ('users-me', 'get', '/api/users/me/', False),
+    ('users-detail', 'get', '/api/users/{author}/', False),
+    ('subscriptions', 'get',
+     '/api/users/subscriptions/?limit={limit}&recipes_limit={limit}', False),
+    ('subscribe', 'post', '/api/users/{author}/subscribe/', False),
+    ('subscribe', 'delete', '/api/users/{author}/subscribe/', False),
+)
+
+
+class FoodgramTestCase(APITestCase):
+    """
+    Несколько авторов с рецептами, тегами и ингредиентами. Кэш
+    очищается перед каждым тестом: иначе в нём остались бы данные
+    откаченных транзакций.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password',
+            first_name='Имя', last_name='Фамилия'
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {index}', color=f'#00000{index}', slug=f'tag{index}'
+            )
+            for index in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г'
+            )
+            for index in range(3)
+        ]
+        cls.authors = []
+        cls.recipes = []
+        for index in range(AUTHORS):
+            author = User.objects.create_user(
+                username=f'author{index}', email=f'author{index}@example.com',
+                password='password', first_name='Имя', last_name='Фамилия'
+            )
+            cls.authors.append(author)
+            for number in range(RECIPES_PER_AUTHOR):
+                recipe = Recipe.objects.create(
+                    author=author, name=f'Рецепт {index}-{number}',
+                    image='recipes/media/test.png', text='Описание',
+                    cooking_time=10
+                )
+                recipe.tags.set(cls.tags)
+                RecipeIngredient.objects.bulk_create(
+                    RecipeIngredient(
+                        recipe=recipe, ingredient=ingredient, amount=100
+                    )
+                    for ingredient in cls.ingredients
+                )
+                cls.recipes.append(recipe)
+            Follow.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def save_recipe(self, recipe, **fields):
+        """
+        Сохраняет рецепт и выполняет обработчики коммита. Копии картинки
+        не строятся: файла test.png в хранилище нет.
+        """
+        for name, value in fields.items():
+            setattr(recipe, name, value)
+        with mock.patch('recipes.signals.schedule_renditions'), \
+                self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+
+    def count_queries(self, path):
+        """
+        Число запросов к базе на холодных кэшах.
+        """
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        return len(queries)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'реплика создаётся в SQLite')
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTest(FoodgramTestCase):
+    """
+    Реплика — отдельная пустая база replica_test из настроек, а не
+    зеркало основной: по ответу видно, из какой базы читал запрос.
+    """
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        # Миграции роутер применяет только к основной базе.
+        replica = connections[REPLICA]
+        tables = set(replica.introspection.table_names())
+        with replica.schema_editor() as editor:
+            for model in apps.get_models():
+                if (model._meta.managed and not model._meta.proxy
+                        and model._meta.db_table not in tables):
+                    editor.create_model(model)
+        super().setUpClass()
+
+    def get_count(self, **kwargs):
+        response = self.client.get(f'/api/recipes/?limit={LARGE_PAGE}',
+                                   **kwargs)
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        return response.data['count']
+
+    def test_writes_go_to_primary(self):
+        use_replica()
+        self.addCleanup(use_primary)
+        self.assertEqual(
+            PrimaryReplicaRouter().db_for_write(Favorite), PRIMARY_DATABASE
+        )
+        response = self.client.post(
+            f'/api/recipes/{self.recipes[0].id}/favorite/'
+        )
+        self.assertEqual(response.status_code, 201, response.content[:200])
+        self.assertTrue(Favorite.objects.using(PRIMARY_DATABASE).exists())
+        self.assertFalse(Favorite.objects.using(REPLICA).exists())
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.get_count(), 0)
+        response = self.client.get(f'/api/recipes/{self.recipes[0].id}/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_sticky_window_reads_from_primary(self):
+        primary_until = str(time.time() + 60)
+        self.assertEqual(
+            self.get_count(HTTP_X_PRIMARY_UNTIL=primary_until),
+            len(self.recipes)
+        )
+        self.client.cookies[STICKY_COOKIE] = primary_until
+        self.assertEqual(self.get_count(), len(self.recipes))
+        self.client.cookies[STICKY_COOKIE] = str(time.time() - 1)
+        self.assertEqual(self.get_count(), 0)
+
+    def test_write_opens_sticky_window(self):
+        response = self.client.post(
+            f'/api/recipes/{self.recipes[0].id}/favorite/'
+        )
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.get_count(), len(self.recipes))
+
+    def test_use_primary_overrides_replica(self):
+        use_replica()
+        self.assertEqual(PrimaryReplicaRouter().db_for_read(Recipe), REPLICA)
+        use_primary()
+        self.assertEqual(
+            PrimaryReplicaRouter().db_for_read(Recipe), PRIMARY_DATABASE
+        )
+        # Промах кэша анонимных ответов читает из основной базы.
+        self.client.force_authenticate(None)
+        self.assertEqual(self.get_count(), len(self.recipes))
+
+
+class RecipeListQueriesTest(FoodgramTestCase):
+
+    def test_query_count_does_not_depend_on_limit(self):
+        small = self.count_queries(f'/api/recipes/?limit={SMALL_PAGE}')
+        large = self.count_queries(f'/api/recipes/?limit={LARGE_PAGE}')
+        self.assertEqual(small, large)
+
+    def test_page_is_loaded_in_fixed_number_of_queries(self):
+        cache.clear()
+        # Варианты фильтра по тегам, COUNT(*) и id страницы; избранное,
+        # корзина и подписки пользователя; рецепты, их теги, авторы
+        # и ингредиенты.
+        with self.assertNumQueries(10):
+            response = self.client.get(f'/api/recipes/?limit={LARGE_PAGE}')
+        self.assertEqual(len(response.data['results']), LARGE_PAGE)
+
+
+class SubscriptionsTest(FoodgramTestCase):
+    url = '/api/users/subscriptions/?limit={}&recipes_limit={}'
+
+    def test_query_count_does_not_depend_on_limits(self):
+        small = self.count_queries(self.url.format(SMALL_PAGE, SMALL_PAGE))
+        large = self.count_queries(self.url.format(LARGE_PAGE, LARGE_PAGE))
+        self.assertEqual(small, large)
+
+    def test_feed_is_loaded_in_fixed_number_of_queries(self):
+        # COUNT(*) и страница авторов, последние рецепты всех авторов
+        # одним запросом.
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url.format(LARGE_PAGE, 2))
+        self.assertEqual(len(response.data['results']), AUTHORS)
+        for author in response.data['results']:
+            self.assertEqual(len(author['recipes']), 2)
+            self.assertEqual(author['recipes_count'], RECIPES_PER_AUTHOR)
+
+    def test_zero_recipes_limit_returns_no_recipes(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url.format(LARGE_PAGE, 0))
+        for author in response.data['results']:
+            self.assertEqual(author['recipes'], [])
+            self.assertEqual(author['recipes_count'], RECIPES_PER_AUTHOR)
+
+    def test_invalid_recipes_limit(self):
+        author = User.objects.create_user(
+            username='new-author', email='new-author@example.com',
+            password='password', first_name='Имя', last_name='Фамилия'
+        )
+        for value in ('abc', '-1', '1.5'):
+            with self.subTest(value):
+                response = self.client.get(self.url.format(LARGE_PAGE, value))
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipes_limit', response.data)
+                response = self.client.post(
+                    f'/api/users/{author.id}/subscribe/'
+                    f'?recipes_limit={value}'
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(
+            Follow.objects.filter(user=self.user, author=author).exists()
+        )
+
+    def test_without_recipes_limit_returns_all_recipes(self):
+        response = self.client.get(
+            f'/api/users/subscriptions/?limit={LARGE_PAGE}'
+        )
+        for author in response.data['results']:
+            self.assertEqual(len(author['recipes']), RECIPES_PER_AUTHOR)
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+
+    def test_whitespace_in_base64_is_ignored(self):
+        header, encoded = IMAGE.split(',', 1)
+        wrapped = '\n'.join(
+            encoded[start:start + 20] for start in range(0, len(encoded), 20)
+        )
+        image = Base64ImageField().to_internal_value(
+            f'{header},\n{wrapped}\n'
+        )
+        self.assertEqual(image.read(), b64decode(encoded))
+
+
+class AsyncMiddlewareTest(FoodgramTestCase):
+    """
+    Под ASGI собственные middleware не должны уводить запрос в поток:
+    иначе запросы обрабатываются по одному.
+    """
+
+    def test_middlewares_are_async_in_async_chain(self):
+        async def get_response(request):
+            return None
+
+        for middleware in (MetricsMiddleware, ReplicaRoutingMiddleware):
+            with self.subTest(middleware.__name__):
+                self.assertTrue(
+                    asyncio.iscoroutinefunction(middleware(get_response))
+                )
+                self.assertFalse(asyncio.iscoroutinefunction(
+                    middleware(lambda request: None)
+                ))
+
+    async def test_request_through_async_chain(self):
+        response = await self.async_client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('view="tags-list",method="GET"', registry.expose())
+
+
+class MetricsLabelsTest(FoodgramTestCase):
+
+    def test_unknown_methods_share_one_label(self):
+        for method in ('FOO', 'BAR'):
+            self.client.generic(method, '/api/tags/')
+        metrics = registry.expose()
+        self.assertIn('view="tags-list",method="other"', metrics)
+        self.assertNotIn('method="FOO"', metrics)
+        self.assertNotIn('method="BAR"', metrics)
+
+
+@skipUnless(orjson is not None, 'orjson не установлен')
+class FastJSONTest(FoodgramTestCase):
+    """
+    Вывод и разбор через orjson должны совпадать со стандартными
+    JSONRenderer и JSONParser байт в байт.
+    """
+
+    def get_payload(self):
+        recipe = self.recipes[0]
+        Recipe.objects.filter(pk=recipe.pk).update(
+            name='Щи «по-домашнему» 🍲', text='Строка\u2028абзац\u2029 «ё»'
+        )
+        response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        return response, {
+            **response.data,
+            'price': Decimal('12.50'),
+            'rating': 4.75,
+            'published': date(2024, 2, 29),
+            'created': datetime(
+                2024, 2, 29, 23, 59, 1, 123456,
+                tzinfo=timezone(timedelta(hours=3))
+            ),
+        }
+
+    def test_renderer_matches_json_renderer(self):
+        response, payload = self.get_payload()
+        self.assertEqual(
+            response.content, JSONRenderer().render(response.data)
+        )
+        # Полезная нагрузка должна пройти быстрым путём, без отката
+        # на стандартный рендерер.
+        with mock.patch.object(
+            JSONRenderer, 'render', side_effect=AssertionError
+        ):
+            content = FastJSONRenderer().render(payload)
+        self.assertEqual(content, JSONRenderer().render(payload))
+
+    def test_numbers_orjson_writes_differently(self):
+        for value in (1e-7, 1e17, 0.00001, -1e-05, 2 ** 70):
+            with self.subTest(value):
+                self.assertEqual(
+                    FastJSONRenderer().render({'value': value}),
+                    JSONRenderer().render({'value': value})
+                )
+
+    def test_parser_matches_json_parser(self):
+        _, payload = self.get_payload()
+        body = JSONRenderer().render({**payload, 'views': 2 ** 70})
+        self.assertEqual(
+            FastJSONParser().parse(BytesIO(body)),
+            JSONParser().parse(BytesIO(body))
+        )
+
+
+class RecipeIngredientsUpdateTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipe = cls.recipes[0]
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipe)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.recipe.author)
+
+    def patch_ingredients(self, amounts):
+        return self.client.patch(
+            f'/api/recipes/{self.recipe.id}/',
+            {
+                'tags': [tag.id for tag in self.tags],
+                'ingredients': [
+                    {'id': ingredient.id, 'amount': amount}
+                    for ingredient, amount in zip(self.ingredients, amounts)
+                ],
+            },
+            format='json'
+        )
+
+    def test_cart_summaries_are_rebuilt_once(self):
+        with mock.patch.object(
+            cart, 'rebuild_cart_summaries', wraps=cart.rebuild_cart_summaries
+        ) as rebuild:
+            response = self.patch_ingredients((100, 250))
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        rebuild.assert_called_once()
+        self.assertEqual(
+            sorted(ShoppingCartSummary.objects.filter(
+                user=self.user
+            ).values_list('name', 'amount')),
+            [(self.ingredients[0].name, 100), (self.ingredients[1].name, 250)]
+        )
+
+    def test_removed_rows_are_deleted_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.patch_ingredients((100,))
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        deletes = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(
+                'DELETE FROM "recipes_recipeingredient"'
+            )
+        ]
+        self.assertEqual(len(deletes), 1, deletes)
+        # Без обработчиков на каждую строку удаление не читает строки
+        # заново, а корзины пересчитываются один раз.
+        self.assertEqual(len(queries), 22)
+
+
+class RankedListsTest(FoodgramTestCase):
+    """
+    Списки по рейтингу выводятся по номеру страницы и с ?cursor=:
+    курсор по id потерял бы их порядок.
+    """
+    query = '?limit=2&cursor=cD0xMA%3D%3D'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        first, second, third = cls.recipes[1:4]
+        cls.ranked = [first.id, third.id, second.id]
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe=cls.recipes[0], similar=recipe, score=score)
+            for recipe, score in ((first, 0.9), (third, 0.8), (second, 0.7))
+        )
+
+    def get_ids(self, path, params=''):
+        response = self.client.get(path + self.query + params)
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        self.assertIn('count', response.data)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_pantry_ignores_cursor(self):
+        ingredient = Ingredient.objects.create(
+            name='Редкий ингредиент', measurement_unit='г'
+        )
+        for recipe in self.recipes[:3]:
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=100
+            )
+        self.assertEqual(
+            self.get_ids(
+                '/api/recipes/pantry/', f'&ingredients={ingredient.id}'
+            ),
+            [self.recipes[2].id, self.recipes[1].id]
+        )
+
+    def test_similar_ignores_cursor(self):
+        self.assertEqual(
+            self.get_ids(f'/api/recipes/{self.recipes[0].id}/similar/'),
+            self.ranked[:2]
+        )
+
+    def test_recommended_ignores_cursor(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        self.assertEqual(
+            self.get_ids('/api/recipes/recommended/'), self.ranked[:2]
+        )
+
+    def test_popular_fallback_ignores_cursor(self):
+        for recipe, count in zip(self.recipes[:2], (5, 3)):
+            Recipe.objects.filter(pk=recipe.pk).update(favorites_count=count)
+        self.assertEqual(
+            self.get_ids('/api/recipes/recommended/'),
+            [self.recipes[0].id, self.recipes[1].id]
+        )
+
+
+@skipUnless(
+    connection.vendor != 'postgresql', 'индекс в памяти — без PostgreSQL'
+)
+class RecipeSearchTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        author = cls.authors[0]
+        cls.in_name, cls.in_ingredients, cls.in_text = (
+            Recipe.objects.create(
+                author=author, name=name, image='recipes/media/test.png',
+                text=text, cooking_time=10
+            )
+            for name, text in (
+                ('Борщ', 'Описание'),
+                ('Суп', 'Описание'),
+                ('Щи', 'Подавать как борщ'),
+            )
+        )
+        RecipeIngredient.objects.create(
+            recipe=cls.in_ingredients, amount=100,
+            ingredient=Ingredient.objects.create(
+                name='Заправка для борща', measurement_unit='г'
+            )
+        )
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_name_ranks_above_ingredients_and_text(self):
+        self.assertEqual(self.search('борщи'), [
+            self.in_name.id, self.in_ingredients.id, self.in_text.id
+        ])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search('борщ как'), [self.in_text.id])
+
+    def test_edited_recipe_is_found(self):
+        self.assertEqual(self.search('щавель'), [])
+        self.save_recipe(self.in_text, name='Борщ со щавелем')
+        self.assertEqual(self.search('щавель'), [self.in_text.id])
+        self.assertEqual(self.search('борщ')[0], self.in_text.id)
+
+
+class RecipeDocumentsTest(FoodgramTestCase):
+
+    def test_document_built_before_write_is_not_served(self):
+        recipe = self.recipes[0]
+        build = documents.build_documents
+
+        def build_during_write(recipe_ids):
+            built = build(recipe_ids)
+            # Запись коммитится, пока читатель собирает документ.
+            Recipe.objects.filter(pk=recipe.pk).update(name='Новое название')
+            documents.invalidate_documents([recipe.pk])
+            return built
+
+        with mock.patch.object(
+            documents, 'build_documents', side_effect=build_during_write
+        ):
+            self.assertEqual(
+                documents.get_documents([recipe.pk])[recipe.pk]['name'],
+                recipe.name
+            )
+        self.assertEqual(
+            documents.get_documents([recipe.pk])[recipe.pk]['name'],
+            'Новое название'
+        )
+
+
+class UserStateTest(FoodgramTestCase):
+
+    def test_state_loaded_before_write_is_not_served(self):
+        recipe = self.recipes[0]
+        load = UserState.load.__func__
+
+        def load_during_write(cls, user_id):
+            state = load(cls, user_id)
+            # Запись коммитится, пока читатель загружает состояние.
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            invalidate_user_state(self.user.id)
+            return state
+
+        with mock.patch.object(
+            UserState, 'load', classmethod(load_during_write)
+        ):
+            state = get_user_state(SimpleNamespace(user=self.user))
+        self.assertFalse(state.contains('favorites', recipe.id))
+        state = get_user_state(SimpleNamespace(user=self.user))
+        self.assertTrue(state.contains('favorites', recipe.id))
+
+
+class CursorPaginationTest(FoodgramTestCase):
+    limit = 4
+
+    def get_page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def get_ids(self):
+        return sorted((recipe.id for recipe in self.recipes), reverse=True)
+
+    def test_pages_do_not_overlap(self):
+        page = self.get_page(f'/api/recipes/?cursor=&limit={self.limit}')
+        self.assertNotIn('count', page)
+        ids = [recipe['id'] for recipe in page['results']]
+        # Рецепт, добавленный во время обхода, не сдвигает страницы.
+        Recipe.objects.create(
+            author=self.authors[0], name='Новый рецепт',
+            image='recipes/media/test.png', text='Описание', cooking_time=10
+        )
+        while page['next']:
+            page = self.get_page(page['next'])
+            self.assertLessEqual(len(page['results']), self.limit)
+            ids.extend(recipe['id'] for recipe in page['results'])
+        self.assertEqual(ids, self.get_ids())
+
+    def test_previous_page_is_stable(self):
+        first = self.get_page(f'/api/recipes/?cursor=&limit={self.limit}')
+        second = self.get_page(first['next'])
+        self.assertEqual(
+            self.get_page(second['previous'])['results'], first['results']
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/?cursor=abc')
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_contract(self):
+        page = self.get_page(f'/api/recipes/?page=2&limit={self.limit}')
+        self.assertEqual(page['count'], len(self.recipes))
+        self.assertEqual(
+            [recipe['id'] for recipe in page['results']],
+            self.get_ids()[self.limit:2 * self.limit]
+        )
+        self.assertIn('page=3', page['next'])
+        self.assertNotIn('cursor', page['next'])
+        self.assertIn('limit=4', page['previous'])
+
+
+class ShoppingListDownloadTest(FoodgramTestCase):
+    url = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for recipe in cls.recipes[:2]:
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def download(self, export_format):
+        response = self.client.get(self.url, {'format': export_format})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Disposition'],
+            f'attachment; filename="shopping_cart.{export_format}"'
+        )
+        return response, b''.join(response.streaming_content)
+
+    def test_txt(self):
+        response, content = self.download('txt')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(content.decode(), 'Список покупок\n\n' + ''.join(
+            f'• {ingredient.name} (г) - 200\n'
+            for ingredient in self.ingredients
+        ))
+
+    def test_csv(self):
+        response, content = self.download('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(content.decode(), ''.join(
+            ['name,measurement_unit,amount\r\n']
+            + [f'{ingredient.name},г,200\r\n'
+               for ingredient in self.ingredients]
+        ))
+
+    def test_pdf(self):
+        response, content = self.download('pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(content.startswith(b'%PDF-'))
+
+    def test_unknown_format(self):
+        response = self.client.get(self.url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('errors', response.data)
+
+
+class IngredientSearchTest(FoodgramTestCase):
+    names = ('Тростниковый сахар', 'Сахарная пудра', 'Ванильный сахар',
+             'Сахар', 'Медовик', 'Мёд')
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г') for name in cls.names
+        )
+
+    def search(self, query):
+        response = self.client.get('/api/ingredients/', {'name': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data]
+
+    def test_prefix_matches_come_first(self):
+        self.assertEqual(self.search('сахар'), [
+            'Сахар', 'Сахарная пудра',
+            'Ванильный сахар', 'Тростниковый сахар',
+        ])
+
+    def test_substring_fallback(self):
+        self.assertEqual(self.search('пудр'), ['Сахарная пудра'])
+
+    def test_case_and_yo_are_folded(self):
+        self.assertEqual(self.search('МЕД'), ['Мёд', 'Медовик'])
+        self.assertEqual(self.search('мёдо'), ['Медовик'])
+
+    @override_settings(INGREDIENT_SEARCH_LIMIT=3)
+    def test_limit_keeps_prefix_matches(self):
+        self.assertEqual(self.search('сахар'), [
+            'Сахар', 'Сахарная пудра', 'Ванильный сахар'
+        ])
+
+
+class CatalogConditionalTest(FoodgramTestCase):
+
+    def assert_not_modified(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        return etag
+
+    def assert_changed(self, url, instance, **fields):
+        etag = self.assert_not_modified(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in fields.items():
+                setattr(instance, name, value)
+            instance.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def test_matching_etag_returns_not_modified(self):
+        for url in ('/api/tags/', f'/api/tags/{self.tags[0].id}/',
+                    '/api/ingredients/',
+                    f'/api/ingredients/{self.ingredients[0].id}/'):
+            with self.subTest(url):
+                self.assert_not_modified(url)
+
+    def test_tag_save_changes_etag(self):
+        tag = self.tags[0]
+        response = self.assert_changed(
+            f'/api/tags/{tag.id}/', tag, name='Новый тег'
+        )
+        self.assertEqual(response.data['name'], 'Новый тег')
+
+    def test_ingredient_save_changes_etag(self):
+        ingredient = self.ingredients[0]
+        response = self.assert_changed(
+            '/api/ingredients/', ingredient, measurement_unit='кг'
+        )
+        self.assertIn(
+            {'id': ingredient.id, 'name': ingredient.name,
+             'measurement_unit': 'кг'},
+            response.data
+        )
+
+
+class AnonymousResponseCacheTest(FoodgramTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+        self.url = f'/api/recipes/?limit={SMALL_PAGE}'
+
+    def test_public_response_has_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Authorization', response['Vary'])
+        self.assertNotIn('Last-Modified', response)
+        cached = self.client.get(self.url)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_recipe_save_changes_etag(self):
+        recipe = self.recipes[-1]
+        etag = self.client.get(self.url)['ETag']
+        self.save_recipe(recipe, name='Новое название')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['name'], recipe.name)
+
+    def test_authenticated_response_is_private(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Authorization', response['Vary'])
+        self.assertNotIn('ETag', response)
+
+
+class ProcessIndexTest(FoodgramTestCase):
+    """
+    Два экземпляра индекса изображают два процесса с общим кэшем.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.reader = PantryIndex()
+        self.writer = PantryIndex()
+        self.reader.refresh()
+        self.writer.refresh()
+        self.ingredient = Ingredient.objects.create(
+            name='Новый ингредиент', measurement_unit='г'
+        )
+
+    def create_recipe(self):
+        recipe = Recipe.objects.create(
+            author=self.authors[0], name='Новый рецепт',
+            image='recipes/media/test.png', text='Описание', cooking_time=10
+        )
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=self.ingredient, amount=100
+        )
+        return recipe
+
+    def match(self, index):
+        return [
+            recipe_id for recipe_id, _, _ in index.match([self.ingredient.id])
+        ]
+
+    def test_other_process_applies_only_changed_recipes(self):
+        recipe = self.create_recipe()
+        self.writer.update([recipe.id])
+        with mock.patch.object(self.reader, 'rebuild') as rebuild:
+            self.assertEqual(self.match(self.reader), [recipe.id])
+            recipe_id = recipe.id
+            recipe.delete()
+            self.writer.update([recipe_id])
+            self.assertEqual(self.match(self.reader), [])
+        rebuild.assert_not_called()
+
+    def test_own_update_does_not_skip_other_changes(self):
+        recipe = self.create_recipe()
+        self.reader.update([recipe.id])
+        self.writer.update([self.recipes[0].id])
+        self.assertEqual(self.match(self.writer), [recipe.id])
+
+    def test_lost_changes_rebuild_index(self):
+        recipe = self.create_recipe()
+        self.writer.update([recipe.id])
+        # Кэш очищен в setUp: это первая запись журнала.
+        cache.delete(self.writer.change_key.format(1))
+        with mock.patch.object(
+            self.reader, 'rebuild', wraps=self.reader.rebuild
+        ) as rebuild:
+            self.assertEqual(self.match(self.reader), [recipe.id])
+        rebuild.assert_called_once()
+
+    def test_match_waits_for_rebuild(self):
+        recipe = self.create_recipe()
+        self.writer.invalidate()
+        add = self.reader.add
+        results = []
+        reader = threading.Thread(target=lambda: results.append(
+            self.match(self.reader)
+        ))
+
+        def add_during_match(recipe_ids=None):
+            # Индекс уже очищен: поток-читатель не должен увидеть его
+            # пустым, пока перестроение не закончится.
+            with mock.patch.object(self.reader, 'refresh'):
+                reader.start()
+                reader.join(timeout=0.1)
+            self.assertTrue(reader.is_alive())
+            add(recipe_ids)
+
+        with mock.patch.object(
+            self.reader, 'add', side_effect=add_during_match
+        ):
+            self.reader.refresh()
+        reader.join()
+        self.assertEqual(results, [[recipe.id]])
+
+    def test_invalidate_rebuilds_index(self):
+        self.writer.invalidate()
+        with mock.patch.object(
+            self.reader, 'rebuild', wraps=self.reader.rebuild
+        ) as rebuild:
+            self.reader.refresh()
+        rebuild.assert_called_once()
+
+
+@skipUnless(
+    connection.vendor in SEQUENTIAL_SCANS,
+    'план запроса проверяется только в PostgreSQL и SQLite'
+)
+class QueryPlanTest(FoodgramTestCase):
+    """
+    Горячие запросы фильтров и проверок по (user, recipe) и (user,
+    author) должны идти по индексам.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[1])
+
+    def get_hot_queries(self):
+        user, author, recipe = self.user, self.authors[0], self.recipes[0]
+        return {
+            'tags': Recipe.objects.filter(tags__slug=self.tags[0].slug),
+            'author': Recipe.objects.filter(author__id=author.id),
+            'favorited': Recipe.objects.filter(favorites__user=user),
+            'in_shopping_cart': Recipe.objects.filter(
+                shopping_cart__user=user
+            ),
+            'ids': Recipe.objects.filter(id__in=[recipe.id]),
+            'favorite_exists': Favorite.objects.filter(
+                user=user, recipe=recipe
+            ),
+            'cart_exists': ShoppingCart.objects.filter(
+                user=user, recipe=recipe
+            ),
+            'follow_exists': Follow.objects.filter(user=user, author=author),
+            'favorite_ids': Favorite.objects.filter(user=user).values_list(
+                'recipe_id', flat=True
+            ),
+            'following_ids': Follow.objects.filter(user=user).values_list(
+                'author_id', flat=True
+            ),
+            'subscriptions': User.objects.filter(following__user=user),
+        }
+
+    def test_hot_queries_use_indexes(self):
+        if connection.vendor == 'postgresql':
+            # На маленькой базе полный просмотр дешевле индекса,
+            # поэтому проверяется, что индекс вообще применим.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        pattern = SEQUENTIAL_SCANS[connection.vendor]
+        for name, queryset in self.get_hot_queries().items():
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertIsNone(pattern.search(plan), plan)
+
+
+def get_route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from get_route_names(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+
+def get_origin():
+    """
+    Ближайший к запросу кадр стека из кода проекта.
+    """
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        if (frame.filename.startswith(str(BASE_DIR))
+                and 'site-packages' not in frame.filename
+                and frame.filename != __file__
+                and frame.name not in ('__call__', 'record_query')):
+            filename = frame.filename[len(str(BASE_DIR)) + 1:]
+            return f'{filename}:{frame.lineno} in {frame.name}'
+    return 'код Django или DRF'
+
+
+class QueryRecorder:
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, get_origin()))
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetsTest(FoodgramTestCase):
+    """
+    Каждый маршрут api/urls.py укладывается в бюджет SQL-запросов,
+    а на списках их число не растёт с размером страницы. При
+    превышении в сообщении — запросы с местом в коде, откуда они
+    выполнены.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.stranger = User.objects.create_user(
+            username='stranger', email='stranger@example.com',
+            password='password', first_name='Имя', last_name='Фамилия'
+        )
+        Recipe.objects.create(
+            author=cls.stranger, name='Рецепт незнакомца',
+            image='recipes/media/test.png', text='Описание', cooking_time=10
+        )
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[0])
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[2])
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe=recipe, similar=similar, score=0.5)
+            for recipe in cls.recipes[1:3]
+            for similar in cls.recipes[3:]
+        )
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = self.settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = get_client(self.user)
+
+    def request(self, method, path, data):
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for database in connections.all():
+                stack.enter_context(database.execute_wrapper(recorder))
+            response = getattr(self.client, method)(path, data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(
+            response.status_code, 400,
+            f'{method.upper()} {path}: {getattr(response, "content", "")}'
+        )
+        return response, recorder.queries
+
+    def measure(self, method, path, data):
+        """
+        Запросы на холодных кэшах, а для чтения — и на прогретых:
+        «прогон → (малая страница, большая)». У путей без размера
+        страницы большой нет.
+        """
+        limits = (SMALL_PAGE, LARGE_PAGE) if '{limit}' in path else (None,)
+        runs = {'cold': []}
+        for limit in limits:
+            cache.clear()
+            response, queries = self.request(
+                method, path.format(limit=limit), data
+            )
+            runs['cold'].append(queries)
+        if method == 'get':
+            # Прогрев обоих размеров: промахи кэшей не должны выглядеть
+            # как рост числа запросов.
+            for limit in limits:
+                self.request(method, path.format(limit=limit), data)
+            runs['warm'] = [
+                self.request(method, path.format(limit=limit), data)[1]
+                for limit in limits
+            ]
+        return response, runs
+
+    @staticmethod
+    def report(queries):
+        return '\n'.join(
+            f'{count} × {origin}\n    {sql[:300]}'
+            for (sql, origin), count in Counter(queries).most_common()
+        )
+
+    def test_every_route_has_budget(self):
+        self.assertEqual(
+            sorted(
+                set(get_route_names(urls.urlpatterns))
+                - set(BUDGETS) - set(UNCHECKED)
+            ),
+            []
+        )
+
+    def test_routes_fit_budgets(self):
+        values = {
+            'tag': self.tags[0].id,
+            'tag_slug': self.tags[0].slug,
+            'ingredient': self.ingredients[0].name[:3],
+            'ingredient_id': self.ingredients[0].id,
+            'recipe': self.recipes[1].id,
+            'author': self.stranger.id,
+            'word': 'Рецепт',
+            'pantry': ','.join(
+                str(ingredient.id) for ingredient in self.ingredients
+            ),
+        }
+        recipe = {
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 10}],
+            'tags': [self.tags[0].id],
+            'image': IMAGE,
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+        for name, method, path, with_body in BUDGET_REQUESTS:
+            path = path.format(**values, limit='{limit}')
+            response, runs = self.measure(
+                method, path, recipe if with_body else None
+            )
+            if method == 'post' and name == 'recipes-list':
+                values['created'] = response.data['id']
+            for run, pages in runs.items():
+                budget = (
+                    BUDGETS[name] + QUERY_HEADROOM if run == 'cold'
+                    else WARM_BUDGETS[name]
+                )
+                with self.subTest(route=name, method=method, run=run):
+                    worst = max(pages, key=len)
+                    self.assertLessEqual(
+                        len(worst), budget, self.report(worst)
+                    )
+                    self.assertLessEqual(
+                        len(pages[-1]), len(pages[0]),
+                        self.report(pages[-1])
+                    )
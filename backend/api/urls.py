@@ -1,7 +1,9 @@
+from django.conf import settings
 from django.conf.urls import url
 from django.urls import include, path
 from rest_framework.routers import SimpleRouter
 
+from .async_views import make_async
 from .views import (CustomUserViewSet, FollowListView, FollowViewSet,
                     IngredientsViewSet, RecipesViewSet, TagsViewSet)
 
@@ -12,6 +14,10 @@ router.register('ingredients', IngredientsViewSet, basename='ingredients')
 router.register('recipes', RecipesViewSet, basename='recipes')
 router.register('users', CustomUserViewSet, basename='users')
 
+router_urls = router.urls
+if settings.ASYNC_API_VIEWS:
+    router_urls = make_async(router_urls)
+
 
 urlpatterns = [
     path(
@@ -24,7 +30,7 @@ urlpatterns = [
         FollowViewSet.as_view(),
         name='subscribe'
     ),
-    path('', include(router.urls)),
+    path('', include(router_urls)),
     url('', include('djoser.urls')),
     url('auth/', include('djoser.urls.authtoken')),
 ]
@@ -0,0 +1,92 @@
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from foodgram.db_router import PRIMARY_DATABASE
+from .cache import CacheVersions
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follow
+
+CACHE_KEY = 'user-state:{}:{}'
+TYPECODE = 'q'
+SOURCES = {
+    'favorites': (Favorite, 'user_id', 'recipe_id'),
+    'cart': (ShoppingCart, 'user_id', 'recipe_id'),
+    'following': (Follow, 'user_id', 'author_id'),
+}
+
+versions = CacheVersions('user-state:version:{}')
+
+
+class UserState:
+    """
+    Избранное, корзина и подписки пользователя в виде отсортированных
+    массивов id: проверка флага на карточке рецепта — двоичный поиск
+    без обращения к базе.
+    """
+
+    def __init__(self, **ids):
+        for name in SOURCES:
+            setattr(self, name, ids.get(name, array(TYPECODE)))
+
+    @classmethod
+    def load(cls, user_id):
+        # Из основной базы: отстающая реплика закэшировала бы старое
+        # состояние сразу после изменения.
+        return cls(**{
+            name: array(TYPECODE, sorted(
+                model.objects.using(PRIMARY_DATABASE)
+                .filter(**{user_field: user_id})
+                .values_list(id_field, flat=True)
+            ))
+            for name, (model, user_field, id_field) in SOURCES.items()
+        })
+
+    @classmethod
+    def from_bytes(cls, cached):
+        ids = {}
+        for name in SOURCES:
+            ids[name] = array(TYPECODE)
+            ids[name].frombytes(cached[name])
+        return cls(**ids)
+
+    def to_bytes(self):
+        return {name: getattr(self, name).tobytes() for name in SOURCES}
+
+    def contains(self, name, pk):
+        ids = getattr(self, name)
+        index = bisect_left(ids, pk)
+        return index < len(ids) and ids[index] == pk
+
+
+def get_user_state(request):
+    """
+    Состояние текущего пользователя: один раз за запрос из кэша,
+    а при промахе — тремя запросами к базе.
+    """
+    state = getattr(request, 'user_state', None)
+    if state is not None:
+        return state
+    user = request.user
+    if user.is_anonymous:
+        state = UserState()
+    else:
+        # Версия читается до запроса к базе: состояние, собранное
+        # до записи, ляжет под старый ключ.
+        version = versions.get(user.id)
+        key = CACHE_KEY.format(user.id, version)
+        cached = cache.get(key) if version is not None else None
+        if cached is None:
+            state = UserState.load(user.id)
+            if version is not None:
+                cache.add(key, state.to_bytes(), settings.USER_STATE_TIMEOUT)
+        else:
+            state = UserState.from_bytes(cached)
+    request.user_state = state
+    return state
+
+
+def invalidate_user_state(user_id):
+    versions.bump((user_id,))
@@ -1,66 +1,113 @@
-from os import path
-
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import BooleanField, F, Value, Window
+from django.db.models.functions import RowNumber
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.generics import get_object_or_404, ListAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 
-from foodgram.settings import BASE_DIR
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
 from users.models import Follow, User
-from .filters import IngredientSearchFilter, RecipeFilter
+from .autocomplete import ingredient_index
+from .documents import render_recipes
+from .catalog import ingredients_catalog, tags_catalog
+from .filters import RecipeFilter
+from .mixins import AnonymousCacheMixin, ReplicaReadMixin
+from .negotiation import FileDownloadContentNegotiation
+from .pantry import MAX_PANTRY_SIZE, pantry_index
 from .pagination import LimitPageNumberPagination
 from .permissions import IsAuthorOrReadOnly
+from .recommendations import get_recommended, get_similar
+from .response_cache import recipes_response_cache
 from .serializers import (CustomUserSerializer, IngredientSerializer,
                           FollowSerializer, MinimumRecipeSerializer,
-                          RecipeGetSerializer, RecipeSerializer, TagSerializer)
+                          RecipeGetSerializer, RecipeSerializer,
+                          TagSerializer, get_recipes_limit)
+from .shopping_list import (CSV_HEADER, DEFAULT_FORMAT, EXPORT_FORMATS,
+                            get_shopping_list, shopping_list_response)
+from .user_state import get_user_state
 
 
 RECIPE_IN_LIST = 'Рецепт уже добавлен в список'
 RECIPE_NOT_IN_LIST = 'Данного рецепта нет в списке'
-DOCUMENT_TITLE = 'Foodgram, «Продуктовый помощник»'
-FONT_NAME = 'lobster'
-FONT_PATH = path.join(BASE_DIR, f'data/{FONT_NAME}.ttf')
-SHOPPING_CART_TEMPLATE = '• {} ({}) - {}'
 SUBSCRIPTION_EXIST = 'Подписка уже существует'
 SUBSCRIPTION_NOT_EXIST = 'Подписка на данного пользователя отсутствует'
 SELF_SUBSCRIPTION = 'Подписка на себя запрещена!'
+UNKNOWN_FORMAT = 'Неизвестный формат. Доступные форматы: {}'
+PANTRY_INGREDIENTS = ('Передайте от 1 до {} id ингредиентов: '
+                      '?ingredients=1&ingredients=2 или ?ingredients=1,2')
+
 
+class CatalogViewSet(ReplicaReadMixin, ReadOnlyModelViewSet):
+    """
+    Отдаёт справочник из кэша и отвечает 304, если у клиента
+    актуальная версия.
+    """
+    catalog = None
+    pagination_class = None
+
+    def catalog_response(self, state, data):
+        # Только ETag: Last-Modified с секундной точностью после двух
+        # изменений за секунду дал бы неверный 304.
+        etag = quote_etag(f'{self.basename}-{state.generation}')
+        response = get_conditional_response(self.request, etag=etag)
+        if response is None:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
 
-class TagsViewSet(ReadOnlyModelViewSet):
+    def list(self, request, *args, **kwargs):
+        state = self.catalog.refresh()
+        return self.catalog_response(state, state.items)
+
+    def retrieve(self, request, *args, **kwargs):
+        state = self.catalog.refresh()
+        try:
+            item = state.items_by_id.get(int(kwargs['pk']))
+        except ValueError:
+            item = None
+        if item is None:
+            raise NotFound
+        return self.catalog_response(state, item)
+
+
+class TagsViewSet(CatalogViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
-    pagination_class = None
+    catalog = tags_catalog
 
 
-class IngredientsViewSet(ReadOnlyModelViewSet):
+class IngredientsViewSet(CatalogViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name',)
-    pagination_class = None
+    catalog = ingredients_catalog
+    search_param = 'name'
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get(self.search_param)
+        if query:
+            return Response(ingredient_index.search(query))
+        return super().list(request, *args, **kwargs)
 
 
-class RecipesViewSet(ModelViewSet):
+class RecipesViewSet(AnonymousCacheMixin, ReplicaReadMixin, ModelViewSet):
     queryset = Recipe.objects.all()
+    response_cache = recipes_response_cache
     permission_classes = (IsAuthorOrReadOnly,)
     pagination_class = LimitPageNumberPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    replica_actions = ('list', 'retrieve', 'pantry', 'similar', 'recommended')
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in self.replica_actions:
             return RecipeGetSerializer
         return RecipeSerializer
 
@@ -107,35 +154,146 @@ class RecipesViewSet(ModelViewSet):
         return self.delete_method(
             request=request, pk=pk, model=ShoppingCart)
 
-    @action(detail=False, permission_classes=[IsAuthenticated])
-    def download_shopping_cart(self, request):
-        shopping_cart = RecipeIngredient.objects.filter(
-            recipe__shopping_cart__user=request.user).values_list(
-                    'ingredient__name',
-                    'ingredient__measurement_unit'
-                ).annotate(count=Sum('amount'))
-        pdfmetrics.registerFont(
-            TTFont(FONT_NAME, FONT_PATH, 'UTF-8')
+    @staticmethod
+    def get_pantry(request):
+        try:
+            ingredient_ids = {
+                int(pk)
+                for value in request.query_params.getlist('ingredients')
+                for pk in value.split(',') if pk.strip()
+            }
+        except ValueError:
+            return None
+        if 0 < len(ingredient_ids) <= MAX_PANTRY_SIZE:
+            return ingredient_ids
+        return None
+
+    def render_recipes(self, recipe_ids, attributes=None):
+        """
+        Рецепты из готовых документов (api/documents.py): для каждого
+        запроса заново вычисляются только признаки пользователя.
+        """
+        return render_recipes(
+            self.request, get_user_state(self.request), recipe_ids,
+            attributes
+        )
+
+    def page_response(self, queryset, ranked=False):
+        """
+        Страница рецептов из queryset. С ranked=True его порядок
+        сохраняется, а ?cursor= не учитывается.
+        """
+        if ranked:
+            page = self.paginate_ranked(queryset.values('id'))
+        else:
+            # Словари, а не плоский список: курсору нужен атрибут id.
+            page = self.paginate_queryset(queryset.values('id'))
+        return self.get_paginated_response(
+            self.render_recipes([row['id'] for row in page])
+        )
+
+    def paginate_ranked(self, ranked):
+        return self.paginator.paginate_ranked(
+            ranked, self.request, view=self
+        )
+
+    def ranked_response(self, ranked):
+        """
+        Страница рецептов в заданном порядке. ranked — список пар
+        (id рецепта, дополнительные поля ответа).
+        """
+        ranked = self.paginate_ranked(ranked)
+        return self.get_paginated_response(self.render_recipes(
+            [recipe_id for recipe_id, _ in ranked], dict(ranked)
+        ))
+
+    def list_recipes(self, request, *args, **kwargs):
+        return self.page_response(self.filter_queryset(self.get_queryset()))
+
+    def retrieve_recipe(self, request, *args, **kwargs):
+        recipes = self.render_recipes([self.get_object().id])
+        if not recipes:
+            raise NotFound
+        return Response(recipes[0])
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            self.list_recipes, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            self.retrieve_recipe, request, *args, **kwargs
+        )
+
+    @action(detail=False)
+    def pantry(self, request):
+        """
+        Рецепты, которые можно приготовить из переданных ингредиентов,
+        по убыванию доли имеющихся ингредиентов.
+        """
+        ingredient_ids = self.get_pantry(request)
+        if ingredient_ids is None:
+            return Response(
+                {'errors': PANTRY_INGREDIENTS.format(MAX_PANTRY_SIZE)},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = (
-            'attachment;''filename="shopping_cart.pdf"'
+        return self.ranked_response([
+            (recipe_id, {'coverage': round(coverage, 3),
+                         'matched_ingredients': matched})
+            for recipe_id, coverage, matched
+            in pantry_index.match(ingredient_ids)
+        ])
+
+    @action(detail=True)
+    def similar(self, request, pk):
+        """
+        Рецепты, которые чаще всего добавляют вместе с этим.
+        """
+        get_object_or_404(Recipe, pk=pk)
+        return self.ranked_response([
+            (recipe_id, {}) for recipe_id, _ in get_similar(pk)
+        ])
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def recommended(self, request):
+        """
+        Рецепты, похожие на избранное и корзину пользователя, а пока
+        их нет — самые популярные.
+        """
+        ranked = get_recommended(get_user_state(request))
+        if not ranked:
+            return self.page_response(
+                self.get_queryset().order_by('-favorites_count', '-id'),
+                ranked=True
             )
-        pdf_doc = canvas.Canvas(response)
-        pdf_doc.setTitle(DOCUMENT_TITLE)
-        pdf_doc.setFont(FONT_NAME, size=32)
-        pdf_doc.drawCentredString(300, 800, 'Список покупок')
-        pdf_doc.line(100, 780, 480, 780)
-        pdf_doc.setFont(FONT_NAME, size=18)
-        height = 750
-        for ingredient in shopping_cart:
-            pdf_doc.drawString(
-                75, height, (SHOPPING_CART_TEMPLATE.format(*ingredient))
+        return self.ranked_response([
+            (recipe_id, {}) for recipe_id, _ in ranked
+        ])
+
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        content_negotiation_class=FileDownloadContentNegotiation
+    )
+    def download_shopping_cart(self, request):
+        export_format = request.query_params.get('format', DEFAULT_FORMAT)
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'errors': UNKNOWN_FORMAT.format(', '.join(EXPORT_FORMATS))},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            height -= 25
-        pdf_doc.showPage()
-        pdf_doc.save()
-        return response
+        return shopping_list_response(request.user, export_format)
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def shopping_cart_summary(self, request):
+        """
+        Список покупок в JSON: совместимые единицы сложены.
+        """
+        return Response([
+            dict(zip(CSV_HEADER, line))
+            for line in get_shopping_list(request.user)
+        ])
 
 
 class CustomUserViewSet(UserViewSet):
@@ -145,13 +303,51 @@ class CustomUserViewSet(UserViewSet):
     pagination_class = LimitPageNumberPagination
 
 
-class FollowListView(ListAPIView):
+class FollowListView(ReplicaReadMixin, ListAPIView):
+    """
+    Подписки пользователя. Последние рецепты всех авторов страницы
+    загружаются одним запросом с ROW_NUMBER() по каждому автору.
+    """
     permission_classes = (IsAuthenticated,)
     serializer_class = FollowSerializer
     pagination_class = LimitPageNumberPagination
 
     def get_queryset(self):
-        return User.objects.filter(following__user=self.request.user)
+        return User.objects.filter(
+            following__user=self.request.user
+        ).annotate(is_subscribed=Value(True, output_field=BooleanField()))
+
+    @staticmethod
+    def get_latest_recipes(authors, limit):
+        recipes = Recipe.objects.filter(author__in=authors).only(
+            'id', 'author_id', 'name', 'image', 'image_renditions',
+            'cooking_time'
+        )
+        if limit is None:
+            return recipes.order_by('-id')
+        if limit == 0:
+            return Recipe.objects.none()
+        sql, params = recipes.annotate(row_number=Window(
+            RowNumber(), partition_by=F('author_id'), order_by=F('id').desc()
+        )).query.sql_with_params()
+        return Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+            'ORDER BY id DESC',
+            (*params, limit)
+        )
+
+    def list(self, request, *args, **kwargs):
+        recipes_limit = get_recipes_limit(request)
+        authors = self.paginate_queryset(self.filter_queryset(
+            self.get_queryset()
+        ))
+        latest_recipes = {author.id: [] for author in authors}
+        for recipe in self.get_latest_recipes(authors, recipes_limit):
+            latest_recipes[recipe.author_id].append(recipe)
+        for author in authors:
+            author.latest_recipes = latest_recipes[author.id]
+        serializer = self.get_serializer(authors, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
 class FollowViewSet(APIView):
@@ -161,6 +357,8 @@ class FollowViewSet(APIView):
     permission_classes = (IsAuthenticated,)
 
     def post(self, request, pk):
+        # До подписки: иначе ошибка в параметре пришла бы после записи.
+        get_recipes_limit(request)
         if pk == request.user.id:
             return Response(
                 {'error': SELF_SUBSCRIPTION},
@@ -15,6 +15,12 @@ elif [ $1 = "run" ]
   then
     exec $(which gunicorn) foodgram.wsgi:application --bind=0:8000
     exit $?
+elif [ $1 = "run-asgi" ]
+  then
+    export ASYNC_API_VIEWS=1
+    exec $(which gunicorn) foodgram.asgi:application --bind=0:8000 \
+      --worker-class uvicorn.workers.UvicornWorker
+    exit $?
 elif [ $1 = "all" ]
   then
       python manage.py migrate
@@ -0,0 +1,115 @@
+import asyncio
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY_DATABASE = 'default'
+STICKY_COOKIE = 'primary_until'
+STICKY_HEADER = 'X-Primary-Until'
+
+replica_alias = ContextVar('replica_alias', default=None)
+
+
+def use_replica():
+    """
+    Направляет чтения до конца запроса на одну из реплик.
+    """
+    if settings.DATABASE_REPLICAS:
+        replica_alias.set(random.choice(settings.DATABASE_REPLICAS))
+
+
+def use_primary():
+    """
+    Возвращает чтения до конца запроса в основную базу.
+    """
+    replica_alias.set(None)
+
+
+class PrimaryReplicaRouter:
+    """
+    Пишет всегда в основную базу, а читает из реплики только там,
+    где запрос явно разрешил это через use_replica().
+    """
+
+    def db_for_read(self, model, **hints):
+        return replica_alias.get() or PRIMARY_DATABASE
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DATABASE
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Разрешает чтение из реплик только безопасным запросам вне окна
+    после записи. Успешная запись открывает окно: клиент получает
+    cookie и заголовок с моментом, до которого читает из основной базы.
+    Работает и в синхронной цепочке, и в асинхронной, не заставляя
+    ASGI-сервер обрабатывать запросы по одному.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django распознаёт асинхронный __call__ (как у
+            # MiddlewareMixin).
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    @staticmethod
+    def in_sticky_window(request):
+        for value in (request.COOKIES.get(STICKY_COOKIE),
+                      request.headers.get(STICKY_HEADER)):
+            try:
+                if value and float(value) > time.time():
+                    return True
+            except ValueError:
+                continue
+        return False
+
+    def process_request(self, request):
+        request.replica_allowed = (
+            request.method in SAFE_METHODS
+            and not self.in_sticky_window(request)
+        )
+
+    @staticmethod
+    def process_response(request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            primary_until = str(time.time() + settings.REPLICA_STICKY_SECONDS)
+            response.set_cookie(
+                STICKY_COOKIE, primary_until,
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+            response[STICKY_HEADER] = primary_until
+        return response
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        self.process_request(request)
+        token = replica_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            replica_alias.reset(token)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        self.process_request(request)
+        token = replica_alias.set(None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            replica_alias.reset(token)
+        return self.process_response(request, response)
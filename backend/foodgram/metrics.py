@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+SUB_BUCKETS = 4
+# Метод из запроса попадает в метку как есть, поэтому произвольные
+# методы клиентов склеиваются в один ряд «other».
+METHODS = frozenset(
+    ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+)
+
+current_request = ContextVar('current_request', default=None)
+
+
+def log_buckets(lowest, highest):
+    """
+    Границы корзин как у HDR-гистограммы: каждая степень двойки
+    делится на SUB_BUCKETS равных частей, поэтому относительная
+    погрешность одинакова на всём диапазоне.
+    """
+    bounds = []
+    power = lowest
+    while power < highest:
+        step = power / SUB_BUCKETS
+        bounds.extend(power + step * index for index in range(SUB_BUCKETS))
+        power *= 2
+    bounds.append(power)
+    return tuple(bounds)
+
+
+class Histogram:
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def expose(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum:g}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+# Имя метрики → (описание, границы корзин).
+METRICS = {
+    'foodgram_request_duration_seconds': (
+        'Полное время обработки запроса', log_buckets(0.001, 60)),
+    'foodgram_db_queries': (
+        'Число SQL-запросов за запрос', log_buckets(1, 1024)),
+    'foodgram_db_duration_seconds': (
+        'Суммарное время SQL-запросов', log_buckets(0.0005, 60)),
+    'foodgram_serialize_duration_seconds': (
+        'Время представления без SQL: в основном сериализация',
+        log_buckets(0.0005, 60)),
+    'foodgram_render_duration_seconds': (
+        'Время рендеринга ответа', log_buckets(0.0005, 60)),
+    'foodgram_response_size_bytes': (
+        'Размер тела ответа', log_buckets(256, 64 * 1024 * 1024)),
+}
+SLOW_REQUESTS = 'foodgram_slow_requests_total'
+
+
+class Registry:
+    """
+    Гистограммы в памяти процесса по представлению и методу. У каждого
+    воркера свои значения: Prometheus собирает их по отдельности.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.slow_requests = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, values, slow):
+        with self._lock:
+            for name, value in values.items():
+                key = (name, labels)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(METRICS[name][1])
+                self.histograms[key].observe(value)
+            if slow:
+                self.slow_requests[labels] = (
+                    self.slow_requests.get(labels, 0) + 1
+                )
+
+    def expose(self):
+        lines = []
+        with self._lock:
+            for name, (description, _) in METRICS.items():
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, labels), histogram in self.histograms.items():
+                    if metric == name:
+                        lines.extend(histogram.expose(name, labels))
+            lines.append(f'# HELP {SLOW_REQUESTS} Медленные запросы')
+            lines.append(f'# TYPE {SLOW_REQUESTS} counter')
+            for labels, count in self.slow_requests.items():
+                lines.append(f'{SLOW_REQUESTS}{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.view_started = None
+        self.view_finished = None
+        self.db_time_at_view_start = 0.0
+        self.db_time_at_view_finish = None
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def install_query_recorder(connection, **kwargs):
+    """
+    Подключает учёт запросов к каждому новому соединению, в том числе
+    в потоках асинхронных представлений: запрос находится через
+    contextvar, который переходит в эти потоки.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+def get_view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+def get_method_label(request):
+    return request.method if request.method in METHODS else 'other'
+
+
+def get_response_size(response):
+    if response.streaming:
+        return None
+    return len(response.content)
+
+
+class MetricsMiddleware:
+    """
+    Замеряет время запроса, SQL, работу представления и рендеринг,
+    складывает их в гистограммы и пишет в лог запросы сверх бюджета.
+    Под ASGI работает асинхронно, не переключая запрос в поток.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        for connection in connections.all():
+            install_query_recorder(connection)
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django распознаёт асинхронные __call__ и хуки (как
+            # у MiddlewareMixin) и не уводит их в sync_to_async.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+            self.process_view = self.async_process_view
+            self.process_template_response = (
+                self.async_process_template_response
+            )
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.observe(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.observe(request, response, metrics)
+        return response
+
+    @staticmethod
+    def observe(request, response, metrics):
+        finished = time.perf_counter()
+        duration = finished - metrics.started
+        values = {
+            'foodgram_request_duration_seconds': duration,
+            'foodgram_db_queries': metrics.queries,
+            'foodgram_db_duration_seconds': metrics.db_time,
+        }
+        if metrics.view_started is not None:
+            view_finished = metrics.view_finished or finished
+            view_db_time = (
+                metrics.db_time if metrics.db_time_at_view_finish is None
+                else metrics.db_time_at_view_finish
+            ) - metrics.db_time_at_view_start
+            values['foodgram_serialize_duration_seconds'] = max(
+                view_finished - metrics.view_started - view_db_time, 0
+            )
+            values['foodgram_render_duration_seconds'] = (
+                finished - view_finished
+            )
+        size = get_response_size(response)
+        if size is not None:
+            values['foodgram_response_size_bytes'] = size
+        view = get_view_label(request)
+        slow = (duration > settings.SLOW_REQUEST_SECONDS
+                or metrics.queries > settings.SLOW_REQUEST_QUERIES)
+        registry.observe(
+            f'view="{view}",method="{get_method_label(request)}"', values,
+            slow
+        )
+        if slow:
+            logger.warning(
+                'Медленный запрос %s %s (%s): %.3f с, SQL: %d за %.3f с',
+                request.method, request.get_full_path(), view, duration,
+                metrics.queries, metrics.db_time
+            )
+
+    @staticmethod
+    def start_view():
+        metrics = current_request.get()
+        metrics.view_started = time.perf_counter()
+        metrics.db_time_at_view_start = metrics.db_time
+
+    @staticmethod
+    def finish_view():
+        metrics = current_request.get()
+        metrics.view_finished = time.perf_counter()
+        metrics.db_time_at_view_finish = metrics.db_time
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.start_view()
+
+    def process_template_response(self, request, response):
+        self.finish_view()
+        return response
+
+    async def async_process_view(self, request, view_func, view_args,
+                                 view_kwargs):
+        self.start_view()
+
+    async def async_process_template_response(self, request, response):
+        self.finish_view()
+        return response
+
+
+def metrics_view(request):
+    return HttpResponse(registry.expose(), content_type=CONTENT_TYPE)
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -46,6 +47,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'foodgram.db_router.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -81,6 +83,41 @@ DATABASES = {
     }
 }
 
+DATABASE_REPLICAS = []
+REPLICA_LOCATION_KEY = (
+    'NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3') else 'HOST'
+)
+for index, location in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', default='').split(','))):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        REPLICA_LOCATION_KEY: location.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+# Пустая база для тестов маршрутизации на SQLite (api/tests.py): в отличие
+# от зеркала по ответу видно, из какой базы читал запрос. В
+# DATABASE_REPLICAS её нет, поэтому сама по себе она не используется.
+if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+    DATABASES['replica_test'] = {**DATABASES['default'], 'NAME': ':memory:'}
+
+DATABASE_ROUTERS = ['foodgram.db_router.PrimaryReplicaRouter']
+
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', default=5))
+
+# Кэш должен быть общим для всех процессов (memcached через pymemcache):
+# через него воркеры узнают о сбросах справочников, индексов и ответов.
+# locmem по умолчанию годится только для разработки и тестов.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -134,6 +171,19 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6
 }
 
+# JSON через orjson (api/renderers.py, api/parsers.py) с тем же выводом,
+# что у стандартных классов DRF.
+if os.getenv('FAST_JSON', default='1') == '1':
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ]
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] = [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ]
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SEND_ACTIVATION_EMAIL': False,
@@ -148,3 +198,27 @@ DJOSER = {
         'user_list': ['rest_framework.permissions.AllowAny']
     },
 }
+
+USER_STATE_TIMEOUT = int(os.getenv('USER_STATE_TIMEOUT', default=600))
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', default=600))
+
+RESPONSE_CACHE_MAX_AGE = int(os.getenv('RESPONSE_CACHE_MAX_AGE', default=60))
+
+RECIPE_DOCUMENT_TIMEOUT = int(
+    os.getenv('RECIPE_DOCUMENT_TIMEOUT', default=24 * 60 * 60)
+)
+
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', default=1))
+
+SLOW_REQUEST_QUERIES = int(os.getenv('SLOW_REQUEST_QUERIES', default=30))
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=20))
+
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', default=10 * 1024 * 1024))
+
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', default=40_000_000))
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
+ASYNC_API_VIEWS = os.getenv('ASYNC_API_VIEWS', default='') == '1'
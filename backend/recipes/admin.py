@@ -1,13 +1,34 @@
 from django.contrib import admin
 
+from .cart import rebuild_recipe_carts
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+                     ShoppingCart, SimilarRecipe, Tag)
+
+
+class RecipeIngredientInline(admin.TabularInline):
+    model = RecipeIngredient
+    min_num = 1
+    extra = 0
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'favorites_count')
+    """
+    Ингредиенты меняются только в карточке рецепта: сохранение рецепта
+    обновляет индексы и кэши, а сводки корзин пересчитываются здесь
+    один раз на всё изменение.
+    """
+    list_display = ('name', 'author', 'favorites_count', 'in_carts_count')
     list_filter = ('author', 'name', 'tags')
+    inlines = (RecipeIngredientInline,)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change and any(
+            formset.model is RecipeIngredient and formset.has_changed()
+            for formset in formsets
+        ):
+            rebuild_recipe_carts(form.instance.id)
 
 
 @admin.register(Ingredient)
@@ -21,6 +42,24 @@ class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug', 'colored_name')
 
 
+@admin.register(RecipeIngredient)
+class RecipeIngredientAdmin(admin.ModelAdmin):
+    """
+    Только просмотр: строки ингредиентов редактируются в карточке
+    рецепта.
+    """
+    list_display = ('recipe', 'ingredient', 'amount')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(Favorite)
-admin.site.register(RecipeIngredient)
 admin.site.register(ShoppingCart)
+admin.site.register(SimilarRecipe)
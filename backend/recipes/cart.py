@@ -0,0 +1,149 @@
+from collections import Counter, defaultdict
+
+from django.db.models import F
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingCartSummary
+
+# Единица измерения → (базовая единица, сколько в ней базовых).
+UNIT_CONVERSIONS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+    'ч. л.': ('ч. л.', 1),
+    'ст. л.': ('ч. л.', 3),
+}
+# Крупные единицы для вывода, если количество делится на них нацело.
+DISPLAY_UNITS = {
+    'г': (('кг', 1000),),
+    'мл': (('л', 1000),),
+    'ч. л.': (('ст. л.', 3),),
+}
+
+
+def to_base(unit, amount):
+    base_unit, factor = UNIT_CONVERSIONS.get(unit, (unit, 1))
+    return base_unit, amount * factor
+
+
+def from_base(unit, amount):
+    for display_unit, factor in DISPLAY_UNITS.get(unit, ()):
+        if amount % factor == 0:
+            return display_unit, amount // factor
+    return unit, amount
+
+
+def sum_lines(rows):
+    """
+    Складывает строки (название, единица, количество), приводя
+    совместимые единицы к базовой.
+    """
+    lines = Counter()
+    for name, unit, amount in rows:
+        base_unit, base_amount = to_base(unit, amount)
+        lines[name, base_unit] += base_amount
+    return lines
+
+
+def get_recipe_lines(recipe_id):
+    return sum_lines(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient__name', 'ingredient__measurement_unit',
+                  'amount'))
+
+
+def get_summary_items(user_id, lines):
+    """
+    Строки сводки пользователя для перечисленных (название, единица).
+    """
+    return {
+        (item.name, item.measurement_unit): item
+        for item in ShoppingCartSummary.objects.filter(
+            user_id=user_id, name__in={name for name, _ in lines}
+        ).only('id', 'name', 'measurement_unit')
+        if (item.name, item.measurement_unit) in lines
+    }
+
+
+def change_cart_summary(user_id, recipe_id, sign):
+    """
+    Прибавляет (sign=1) или вычитает (sign=-1) ингредиенты рецепта
+    из сводки корзины пользователя.
+    """
+    lines = get_recipe_lines(recipe_id)
+    if not lines:
+        return
+    items = get_summary_items(user_id, lines)
+    if sign > 0 and len(items) < len(lines):
+        # Ту же строку может одновременно вставлять другой рецепт
+        # корзины: недостающие строки создаются пустыми без конфликта,
+        # а количество прибавляется ко всем одним UPDATE.
+        ShoppingCartSummary.objects.bulk_create([
+            ShoppingCartSummary(
+                user_id=user_id, name=name, measurement_unit=unit, amount=0
+            )
+            for name, unit in lines if (name, unit) not in items
+        ], ignore_conflicts=True)
+        items = get_summary_items(user_id, lines)
+    for key, item in items.items():
+        item.amount = F('amount') + sign * lines[key]
+    if items:
+        ShoppingCartSummary.objects.bulk_update(items.values(), ('amount',))
+    if sign < 0:
+        ShoppingCartSummary.objects.filter(
+            user_id=user_id, amount__lte=0
+        ).delete()
+
+
+def rebuild_cart_summaries(user_ids=None):
+    """
+    Пересчитывает сводки корзин с нуля для перечисленных пользователей
+    или для всех. Возвращает число строк сводки.
+    """
+    summaries = ShoppingCartSummary.objects.all()
+    rows = ShoppingCart.objects.all()
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        summaries = summaries.filter(user_id__in=user_ids)
+        rows = rows.filter(user_id__in=user_ids)
+    by_user = defaultdict(list)
+    for user_id, name, unit, amount in rows.values_list(
+        'user_id', 'recipe__recipe_ingredients__ingredient__name',
+        'recipe__recipe_ingredients__ingredient__measurement_unit',
+        'recipe__recipe_ingredients__amount'
+    ).iterator():
+        if name is not None:
+            by_user[user_id].append((name, unit, amount))
+    summaries.delete()
+    items = ShoppingCartSummary.objects.bulk_create([
+        ShoppingCartSummary(
+            user_id=user_id, name=name, measurement_unit=unit, amount=amount
+        )
+        for user_id, user_rows in by_user.items()
+        for (name, unit), amount in sum_lines(user_rows).items()
+    ], batch_size=1000)
+    return len(items)
+
+
+def rebuild_recipe_carts(recipe_id):
+    """
+    Пересчитывает сводки всех корзин с рецептом после изменения
+    его ингредиентов.
+    """
+    user_ids = list(ShoppingCart.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('user_id', flat=True))
+    if user_ids:
+        rebuild_cart_summaries(user_ids)
+
+
+def rebuild_ingredient_carts(ingredient_id):
+    """
+    Пересчитывает сводки всех корзин с ингредиентом после смены его
+    названия или единицы: строки сводки хранят их, а не id.
+    """
+    user_ids = list(ShoppingCart.objects.filter(
+        recipe__recipe_ingredients__ingredient_id=ingredient_id
+    ).values_list('user_id', flat=True).distinct())
+    if user_ids:
+        rebuild_cart_summaries(user_ids)
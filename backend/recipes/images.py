@@ -0,0 +1,121 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from os import path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'thumbnail': (240, 240),
+    'card': (640, 640),
+    'full': (1600, 1600),
+}
+RENDITIONS_DIR = 'recipes/renditions/'
+QUALITY = 82
+
+# Отправляется после записи копий в рецепт: update() не вызывает
+# post_save, а кэши представлений рецепта должны увидеть новые ссылки.
+renditions_built = Signal()
+
+if features.check('webp'):
+    RENDITION_FORMAT, RENDITION_EXTENSION = 'WEBP', 'webp'
+else:
+    RENDITION_FORMAT, RENDITION_EXTENSION = 'JPEG', 'jpg'
+
+executor = (
+    ThreadPoolExecutor(
+        max_workers=settings.IMAGE_WORKERS, thread_name_prefix='renditions'
+    ) if settings.IMAGE_WORKERS else None
+)
+
+
+def render(image, size):
+    rendition = image.copy()
+    rendition.thumbnail(size)
+    if RENDITION_FORMAT == 'JPEG' and rendition.mode != 'RGB':
+        rendition = rendition.convert('RGB')
+    buffer = BytesIO()
+    rendition.save(buffer, RENDITION_FORMAT, quality=QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def build_renditions(recipe_id, image_name):
+    """
+    Сохраняет уменьшенные копии картинки и записывает их в рецепт,
+    если картинка за это время не сменилась. Прежние копии удаляются.
+    """
+    from .models import Recipe
+
+    try:
+        with default_storage.open(image_name) as file:
+            image = ImageOps.exif_transpose(Image.open(file))
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+            stem = path.splitext(path.basename(image_name))[0]
+            renditions = {'source': image_name}
+            for rendition, size in RENDITIONS.items():
+                renditions[rendition] = default_storage.save(
+                    f'{RENDITIONS_DIR}{stem}-{rendition}.'
+                    f'{RENDITION_EXTENSION}',
+                    render(image, size)
+                )
+        with transaction.atomic():
+            recipe = Recipe.objects.select_for_update().filter(
+                pk=recipe_id, image=image_name
+            ).only('image_renditions').first()
+            if recipe is not None:
+                Recipe.objects.filter(pk=recipe_id).update(
+                    image_renditions=renditions
+                )
+        if recipe is None:
+            # Картинку сменили или рецепт удалили, пока копии строились.
+            delete_renditions(renditions)
+            return
+        delete_renditions(recipe.image_renditions, keep=renditions)
+        renditions_built.send(sender=Recipe, recipe_id=recipe_id)
+    except Exception:
+        logger.exception('Не удалось подготовить копии картинки %s',
+                         image_name)
+
+
+def delete_renditions(renditions, keep=None):
+    """
+    Удаляет файлы уменьшенных копий, кроме оригинала и файлов из keep.
+    """
+    if not renditions:
+        return
+    kept = set((keep or {}).values())
+    for rendition in RENDITIONS:
+        name = renditions.get(rendition)
+        if name and name not in kept and name != renditions.get('source'):
+            default_storage.delete(name)
+
+
+def build_renditions_in_worker(recipe_id, image_name):
+    try:
+        build_renditions(recipe_id, image_name)
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(recipe):
+    """
+    После коммита ставит подготовку копий в очередь фоновых потоков
+    (или выполняет сразу, если IMAGE_WORKERS = 0).
+    """
+    recipe_id, image_name = recipe.pk, recipe.image.name
+
+    def submit():
+        if executor is None:
+            build_renditions(recipe_id, image_name)
+        else:
+            executor.submit(build_renditions_in_worker, recipe_id, image_name)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Строит уменьшенные копии картинок рецептов, у которых их нет или
+    они сделаны с прежней картинки, — например, для рецептов,
+    созданных до появления копий. Копии строятся в этом процессе,
+    а не в фоновых потоках.
+    """
+    help = 'build missing image renditions for existing recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='rebuild renditions of every recipe'
+        )
+
+    def handle(self, *args, **options):
+        built = 0
+        for recipe in Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_renditions'
+        ).iterator():
+            image_name = recipe.image.name
+            if (options['force']
+                    or recipe.image_renditions.get('source') != image_name):
+                build_renditions(recipe.id, image_name)
+                built += 1
+        self.stdout.write(f'Обработано рецептов: {built}')
@@ -1,37 +1,104 @@
+import csv
 import json
 import os
+import time
+from itertools import islice
 
 from django.core.management.base import BaseCommand, CommandError
-from django.db.utils import IntegrityError
+from django.db import transaction
 
+from api.catalog import ingredients_catalog
 from foodgram.settings import BASE_DIR
 from recipes.models import Ingredient
 
 DATA_ROOT = os.path.join(BASE_DIR, 'data')
 DEFAULT_FILENAME = 'ingredients.json'
+DEFAULT_BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+NOT_JSON_ARRAY = 'Файл {} должен содержать JSON-массив'
+BROKEN_JSON = 'Файл {} обрывается посреди JSON-массива'
+UNKNOWN_FORMAT = 'Поддерживаются только файлы .json и .csv'
+
+
+def iter_json_array(file, name):
+    """
+    Читает элементы JSON-массива по одному, не загружая файл целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while not buffer:
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk:
+            raise CommandError(NOT_JSON_ARRAY.format(name))
+        buffer = chunk.lstrip()
+    if not buffer.startswith('['):
+        raise CommandError(NOT_JSON_ARRAY.format(name))
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError(BROKEN_JSON.format(name))
+            buffer += chunk
+            continue
+        yield item['name'], item['measurement_unit']
+        buffer = buffer[end:]
+
+
+def iter_csv_rows(file, name):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+READERS = {
+    '.json': iter_json_array,
+    '.csv': iter_csv_rows,
+}
 
 
 class Command(BaseCommand):
-    help = 'load data from json'
+    help = 'load ingredients from json or csv'
 
     def add_arguments(self, parser):
         parser.add_argument('filename', default=DEFAULT_FILENAME, nargs='?',
                             type=str)
+        parser.add_argument('--batch-size', default=DEFAULT_BATCH_SIZE,
+                            type=int)
 
     def handle(self, *args, **options):
+        filename = options['filename']
+        reader = READERS.get(os.path.splitext(filename)[1].lower())
+        if reader is None:
+            raise CommandError(UNKNOWN_FORMAT)
+        started = time.perf_counter()
+        total = 0
         try:
-            with open(os.path.join(DATA_ROOT, options['filename']), 'r',
-                      encoding='utf-8') as file:
-                for ingredient in json.load(file):
-                    try:
-                        Ingredient.objects.create(
-                            name=ingredient['name'],
-                            measurement_unit=ingredient['measurement_unit']
-                            )
-                    except IntegrityError:
-                        print(f'Ошибка! Ингредиент {ingredient["name"]} '
-                              f'({ingredient["measurement_unit"]}) '
-                              f'уже присутствует БД')
-
+            with open(os.path.join(DATA_ROOT, filename), 'r',
+                      encoding='utf-8') as file, transaction.atomic():
+                count_before = Ingredient.objects.count()
+                rows = reader(file, filename)
+                while True:
+                    batch = [
+                        Ingredient(name=name, measurement_unit=unit)
+                        for name, unit in islice(rows, options['batch_size'])
+                    ]
+                    if not batch:
+                        break
+                    Ingredient.objects.bulk_create(
+                        batch, ignore_conflicts=True
+                    )
+                    total += len(batch)
+                inserted = Ingredient.objects.count() - count_before
+                transaction.on_commit(ingredients_catalog.invalidate)
         except FileNotFoundError as error:
             raise CommandError(error)
+        self.stdout.write(
+            f'Добавлено: {inserted}, пропущено: {total - inserted}, '
+            f'время: {time.perf_counter() - started:.3f} с'
+        )
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.cart import rebuild_cart_summaries
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+)
+
+
+def actual_count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'recompute denormalized counters and cart summaries'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model, counter, related_model, field in COUNTERS:
+            actual = actual_count(related_model, field)
+            fixed = model.objects.exclude(
+                **{counter: actual}
+            ).update(**{counter: actual})
+            self.stdout.write(
+                f'{model.__name__}.{counter}: исправлено записей {fixed}'
+            )
+        self.stdout.write(
+            f'Сводки корзин пересобраны, строк: {rebuild_cart_summaries()}'
+        )
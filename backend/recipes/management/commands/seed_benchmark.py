@@ -0,0 +1,139 @@
+import random
+import time
+from uuid import uuid4
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.catalog import tags_catalog
+from api.documents import invalidate_documents
+from api.pantry import pantry_index
+from api.response_cache import recipes_response_cache
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+BENCHMARK_IMAGE = 'recipes/media/benchmark.png'
+NO_INGREDIENTS = ('В базе нет ингредиентов. '
+                  'Сначала выполните: python manage.py load_data')
+WORDS = ('быстрый', 'домашний', 'острый', 'летний', 'сытный', 'лёгкий',
+         'пирог', 'салат', 'суп', 'рагу', 'омлет', 'паста', 'запеканка')
+
+
+class Command(BaseCommand):
+    help = 'generate synthetic users, recipes and relations for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument('--follows-per-user', type=int, default=20)
+        parser.add_argument('--favorites-per-user', type=int, default=30)
+        parser.add_argument('--carts-per-user', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.stdout.write(f'{model.__name__}: {len(objects)}')
+
+    def create_users(self, run, count):
+        password = make_password(BENCHMARK_PASSWORD)
+        prefix = f'bench-{run}-'
+        self.bulk_create(User, [User(
+            username=f'{prefix}{index}',
+            email=f'{prefix}{index}@benchmark.local',
+            first_name='Бенчмарк',
+            last_name=str(index),
+            password=password,
+        ) for index in range(count)])
+        return list(User.objects.filter(
+            username__startswith=prefix
+        ).values_list('id', flat=True))
+
+    def create_tags(self, run, count):
+        colors = set(Tag.objects.values_list('color', flat=True))
+        tags = []
+        for index in range(count):
+            color = f'#{self.random.randrange(0x1000000):06x}'
+            while color in colors:
+                color = f'#{self.random.randrange(0x1000000):06x}'
+            colors.add(color)
+            tags.append(Tag(
+                name=f'Тег {run}-{index}',
+                color=color,
+                slug=f'bench-{run}-{index}',
+            ))
+        self.bulk_create(Tag, tags)
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_recipes(self, run, authors, count):
+        last_id = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first() or 0
+        self.bulk_create(Recipe, [Recipe(
+            author_id=self.random.choice(authors),
+            name=f'{" ".join(self.random.sample(WORDS, 2))} {run}-{index}',
+            image=BENCHMARK_IMAGE,
+            text=' '.join(self.random.choices(WORDS, k=40)),
+            cooking_time=self.random.randint(5, 180),
+        ) for index in range(count)])
+        return list(Recipe.objects.filter(id__gt=last_id).values_list(
+            'id', flat=True
+        ))
+
+    def sample(self, population, count):
+        return self.random.sample(population, min(count, len(population)))
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredients:
+            raise CommandError(NO_INGREDIENTS)
+        started = time.perf_counter()
+        run = uuid4().hex[:8]
+        users = self.create_users(run, options['users'])
+        tags = self.create_tags(run, options['tags'])
+        recipes = self.create_recipes(run, users, options['recipes'])
+        self.bulk_create(RecipeIngredient, [RecipeIngredient(
+            recipe_id=recipe,
+            ingredient_id=ingredient,
+            amount=self.random.randint(1, 500),
+        ) for recipe in recipes for ingredient in self.sample(
+            ingredients, options['ingredients_per_recipe']
+        )])
+        self.bulk_create(Recipe.tags.through, [Recipe.tags.through(
+            recipe_id=recipe, tag_id=tag
+        ) for recipe in recipes for tag in self.sample(
+            tags, options['tags_per_recipe']
+        )])
+        follows = options['follows_per_user']
+        self.bulk_create(Follow, [Follow(
+            user_id=user, author_id=author
+        ) for user in users for author in [
+            author for author in self.sample(users, follows + 1)
+            if author != user
+        ][:follows]])
+        for model, per_user in ((Favorite, options['favorites_per_user']),
+                                (ShoppingCart, options['carts_per_user'])):
+            self.bulk_create(model, [model(
+                user_id=user, recipe_id=recipe
+            ) for user in users for recipe in self.sample(recipes, per_user)])
+        call_command('recount_counters', stdout=self.stdout)
+        call_command('update_search_index', stdout=self.stdout)
+        call_command('update_similar_recipes', full=True, stdout=self.stdout)
+        transaction.on_commit(tags_catalog.invalidate)
+        transaction.on_commit(pantry_index.invalidate)
+        transaction.on_commit(invalidate_documents)
+        transaction.on_commit(recipes_response_cache.invalidate)
+        self.stdout.write(
+            f'Готово за {time.perf_counter() - started:.2f} с, '
+            f'пароль пользователей: {BENCHMARK_PASSWORD}'
+        )
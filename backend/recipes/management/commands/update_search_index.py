@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.search import index_recipes
+
+
+class Command(BaseCommand):
+    help = 'rebuild the full-text search index for all recipes'
+
+    def handle(self, *args, **options):
+        index_recipes()
+        self.stdout.write('Поисковый индекс рецептов обновлён')
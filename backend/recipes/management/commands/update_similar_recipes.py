@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.similarity import BATCH_SIZE, TOP_K, update_similar_recipes
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает похожие рецепты по совместному добавлению в избранное
+    и корзину. По умолчанию — только для рецептов, у которых с прошлого
+    запуска менялись избранное или корзина, и рецептов, связанных с ними.
+    """
+    help = 'recompute top-K similar recipes from favorites and carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true')
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['full']:
+            recipe_ids = None
+            Recipe.objects.filter(similarity_outdated=True).update(
+                similarity_outdated=False
+            )
+        else:
+            recipe_ids = list(Recipe.objects.filter(
+                similarity_outdated=True
+            ).values_list('id', flat=True))
+            if not recipe_ids:
+                self.stdout.write('Изменений с прошлого запуска нет')
+                return
+            # Флаг снимается до чтения данных: изменения, пришедшие
+            # во время пересчёта, попадут в следующий запуск.
+            for start in range(0, len(recipe_ids), BATCH_SIZE):
+                Recipe.objects.filter(
+                    id__in=recipe_ids[start:start + BATCH_SIZE]
+                ).update(similarity_outdated=False)
+        updated = update_similar_recipes(recipe_ids, options['top_k'])
+        self.stdout.write(
+            f'Пересчитано рецептов: {updated}, '
+            f'время: {time.perf_counter() - started:.2f} с'
+        )
@@ -0,0 +1,77 @@
+# Generated by Django 3.2.14 on 2026-10-18 19:21
+
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Копия recipes.cart.UNIT_CONVERSIONS на момент миграции: миграция
+# не должна зависеть от кода, который может измениться.
+UNIT_CONVERSIONS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+    'ч. л.': ('ч. л.', 1),
+    'ст. л.': ('ч. л.', 3),
+}
+
+
+def sum_lines(rows):
+    lines = Counter()
+    for name, unit, amount in rows:
+        base_unit, factor = UNIT_CONVERSIONS.get(unit, (unit, 1))
+        lines[name, base_unit] += amount * factor
+    return lines
+
+
+def fill_summaries(apps, schema_editor):
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingCartSummary = apps.get_model('recipes', 'ShoppingCartSummary')
+    by_user = defaultdict(list)
+    for user_id, name, unit, amount in ShoppingCart.objects.values_list(
+        'user_id', 'recipe__recipe_ingredients__ingredient__name',
+        'recipe__recipe_ingredients__ingredient__measurement_unit',
+        'recipe__recipe_ingredients__amount'
+    ).iterator():
+        if name is not None:
+            by_user[user_id].append((name, unit, amount))
+    ShoppingCartSummary.objects.bulk_create([
+        ShoppingCartSummary(
+            user_id=user_id, name=name, measurement_unit=unit, amount=amount
+        )
+        for user_id, rows in by_user.items()
+        for (name, unit), amount in sum_lines(rows).items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0007_similar_recipes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Название ингредиента')),
+                ('measurement_unit', models.CharField(max_length=200, verbose_name='Базовая единица измерения')),
+                ('amount', models.IntegerField(verbose_name='Количество')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_summary', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Сводка корзины',
+                'verbose_name_plural': 'Сводки корзины',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartsummary',
+            constraint=models.UniqueConstraint(fields=('user', 'name', 'measurement_unit'), name='unique_shopping_cart_summary'),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.utils.html import format_html
@@ -76,6 +77,11 @@ class Recipe(models.Model):
         upload_to='recipes/media/',
         help_text='Прикрепите картинку к рецепту'
     )
+    image_renditions = models.JSONField(
+        'Уменьшенные копии картинки',
+        default=dict,
+        editable=False,
+    )
     text = models.TextField(
         'Описание',
     )
@@ -94,17 +100,43 @@ class Recipe(models.Model):
         'Время приготовления (в минутах)',
         validators=(MinValueValidator(1),),
     )
+    favorites_count = models.PositiveIntegerField(
+        'Количество добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Количество добавлений в список покупок',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+    similarity_outdated = models.BooleanField(
+        'Похожие рецепты устарели',
+        default=True,
+        editable=False,
+    )
 
     class Meta:
+        ordering = ('-id',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [models.Index(
+            fields=['author', '-id'], name='recipe_author_id_idx'
+        )]
 
     def __str__(self):
         return self.name
 
-    @admin.display(description='Количество добавлений в избранное')
-    def favorites_count(self):
-        return self.favorites.count()
+    def get_image_rendition(self, rendition):
+        renditions = self.image_renditions
+        if renditions.get('source') == self.image.name:
+            return renditions.get(rendition, self.image.name)
+        return self.image.name
 
 
 class RecipeIngredient(models.Model):
@@ -184,3 +216,68 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user}: {self.recipe}'
+
+
+class ShoppingCartSummary(models.Model):
+    """
+    Сумма ингредиентов корзины пользователя, приведённых к базовым
+    единицам. Обновляется при изменении корзины.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_summary',
+        verbose_name='Пользователь'
+    )
+    name = models.CharField(
+        'Название ингредиента',
+        max_length=200,
+    )
+    measurement_unit = models.CharField(
+        'Базовая единица измерения',
+        max_length=200,
+    )
+    amount = models.IntegerField('Количество')
+
+    class Meta:
+        ordering = ('name',)
+        verbose_name = 'Сводка корзины'
+        verbose_name_plural = 'Сводки корзины'
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'name', 'measurement_unit'],
+            name='unique_shopping_cart_summary'
+        )]
+
+    def __str__(self):
+        return (f'{self.user}: {self.name} '
+                f'({self.measurement_unit}) - {self.amount}')
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        ordering = ('-score',)
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [models.UniqueConstraint(
+            fields=['recipe', 'similar'], name='unique_similar_recipe'
+        )]
+        indexes = [models.Index(
+            fields=['recipe', '-score'], name='similar_recipe_score_idx'
+        )]
+
+    def __str__(self):
+        return f'{self.recipe_id} → {self.similar_id}: {self.score:.3f}'
@@ -0,0 +1,98 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from users.models import User
+from .cart import change_cart_summary, rebuild_ingredient_carts
+from .images import delete_renditions, schedule_renditions
+from .models import Favorite, Ingredient, Recipe, ShoppingCart
+
+
+def change_counter(model, pk, field, delta, **fields):
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta}, **fields)
+
+
+def change_interactions(recipe_id, field, delta):
+    """
+    Меняет счётчик рецепта и помечает его похожие рецепты устаревшими.
+    """
+    change_counter(Recipe, recipe_id, field, delta, similarity_outdated=True)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_added(instance, created, **kwargs):
+    if created:
+        change_interactions(instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_removed(instance, **kwargs):
+    change_interactions(instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_item_added(instance, created, **kwargs):
+    if created:
+        change_interactions(instance.recipe_id, 'in_carts_count', 1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def cart_item_removed(instance, **kwargs):
+    change_interactions(instance.recipe_id, 'in_carts_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_summary_added(instance, created, **kwargs):
+    if created:
+        change_cart_summary(instance.user_id, instance.recipe_id, 1)
+
+
+# До удаления: при каскадном удалении рецепта его ингредиенты
+# ещё на месте.
+@receiver(pre_delete, sender=ShoppingCart)
+def cart_summary_removed(instance, **kwargs):
+    change_cart_summary(instance.user_id, instance.recipe_id, -1)
+
+
+@receiver(pre_save, sender=Ingredient)
+def remember_ingredient_line(instance, **kwargs):
+    instance.saved_line = Ingredient.objects.filter(
+        pk=instance.pk
+    ).values_list('name', 'measurement_unit').first()
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_line_changed(instance, created, **kwargs):
+    saved_line = getattr(instance, 'saved_line', None)
+    if created or saved_line in (
+        None, (instance.name, instance.measurement_unit)
+    ):
+        return
+    ingredient_id = instance.pk
+    transaction.on_commit(lambda: rebuild_ingredient_carts(ingredient_id))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_added(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(instance, **kwargs):
+    image_name = instance.image.name
+    if image_name and instance.image_renditions.get('source') != image_name:
+        schedule_renditions(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_removed(instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_images_removed(instance, **kwargs):
+    renditions = instance.image_renditions
+    transaction.on_commit(lambda: delete_renditions(renditions))
@@ -0,0 +1,112 @@
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+from scipy import sparse
+
+from .models import Favorite, Recipe, ShoppingCart, SimilarRecipe
+
+# Вес сигнала: избранное говорит об интересе сильнее, чем корзина.
+INTERACTIONS = ((Favorite, 1.0), (ShoppingCart, 0.5))
+TOP_K = 20
+BATCH_SIZE = 500
+
+
+def load_interactions():
+    """
+    Разреженная матрица «пользователи × рецепты»: строки — пользователи,
+    номер столбца совпадает с id рецепта.
+    """
+    users, recipes, weights = [], [], []
+    for model, weight in INTERACTIONS:
+        pairs = np.array(
+            list(model.objects.values_list('user_id', 'recipe_id')),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        users.append(pairs[:, 0])
+        recipes.append(pairs[:, 1])
+        weights.append(np.full(len(pairs), weight, dtype=np.float32))
+    users, rows = np.unique(np.concatenate(users), return_inverse=True)
+    columns = (Recipe.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+    return sparse.csr_matrix(
+        (np.concatenate(weights), (rows, np.concatenate(recipes))),
+        shape=(len(users), columns)
+    )
+
+
+def get_affected(matrix, recipe_ids):
+    """
+    Рецепты, чьё косинусное сходство могло измениться вместе
+    с перечисленными: всё, что встречается у тех же пользователей,
+    и рецепты, у которых они уже в соседях, — после удаления из
+    избранного и корзины общих пользователей в матрице не остаётся.
+    """
+    neighbors = np.fromiter(
+        SimilarRecipe.objects.filter(
+            similar_id__in=recipe_ids.tolist()
+        ).values_list('recipe_id', flat=True).distinct(),
+        dtype=np.int64
+    )
+    recipe_ids = recipe_ids[recipe_ids < matrix.shape[1]]
+    users = np.unique(matrix.tocsc()[:, recipe_ids].indices)
+    return np.union1d(
+        np.union1d(recipe_ids, neighbors),
+        np.unique(matrix[users].indices)
+    )
+
+
+def get_neighbors(matrix, norms, by_recipe, recipe_ids, top_k):
+    """
+    Для каждого рецепта — top_k соседей по косинусу столбцов матрицы.
+    Строки совместной встречаемости считаются одним умножением.
+    """
+    cooccurrence = (by_recipe[recipe_ids] @ matrix).tocsr()
+    neighbors = []
+    for row, recipe_id in enumerate(recipe_ids):
+        begin, end = cooccurrence.indptr[row:row + 2]
+        similar = cooccurrence.indices[begin:end]
+        scores = cooccurrence.data[begin:end]
+        other = similar != recipe_id
+        similar, scores = similar[other], scores[other]
+        scores = scores / (norms[recipe_id] * norms[similar])
+        if len(scores) > top_k:
+            top = np.argpartition(-scores, top_k)[:top_k]
+            similar, scores = similar[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        neighbors.append((int(recipe_id), similar[order], scores[order]))
+    return neighbors
+
+
+def save_neighbors(recipe_ids, neighbors):
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id__in=recipe_ids).delete()
+        SimilarRecipe.objects.bulk_create([
+            SimilarRecipe(
+                recipe_id=recipe_id, similar_id=int(similar_id),
+                score=float(score)
+            )
+            for recipe_id, similar, scores in neighbors
+            for similar_id, score in zip(similar, scores)
+        ])
+
+
+def update_similar_recipes(recipe_ids=None, top_k=TOP_K):
+    """
+    Пересчитывает похожие рецепты для изменившихся рецептов и всех,
+    на чьё сходство они влияют (без recipe_ids — для всех рецептов).
+    Возвращает число пересчитанных рецептов.
+    """
+    matrix = load_interactions()
+    if recipe_ids is None:
+        affected = np.arange(matrix.shape[1])
+    else:
+        affected = get_affected(
+            matrix, np.asarray(recipe_ids, dtype=np.int64)
+        )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    by_recipe = matrix.T.tocsr()
+    for start in range(0, len(affected), BATCH_SIZE):
+        batch = affected[start:start + BATCH_SIZE]
+        save_neighbors(batch.tolist(), get_neighbors(
+            matrix, norms, by_recipe, batch, top_k
+        ))
+    return len(affected)
@@ -0,0 +1,233 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from PIL import Image
+
+from users.models import User
+from . import cart
+from .images import RENDITIONS, build_renditions
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, ShoppingCartSummary, SimilarRecipe)
+from .similarity import update_similar_recipes
+
+
+def save_image(name):
+    buffer = BytesIO()
+    Image.new('RGB', (800, 600), 'orange').save(buffer, 'PNG')
+    return default_storage.save(
+        f'recipes/media/{name}.png', ContentFile(buffer.getvalue())
+    )
+
+
+class ImageRenditionsTest(TestCase):
+    """
+    Файлы копий не должны оставаться в хранилище после смены
+    картинки и удаления рецепта.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = self.settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Имя', last_name='Фамилия'
+        )
+        self.first_image = save_image('first')
+        self.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', image=self.first_image,
+            text='Описание', cooking_time=10
+        )
+
+    def get_renditions(self):
+        self.recipe.refresh_from_db()
+        return [
+            self.recipe.image_renditions[rendition]
+            for rendition in RENDITIONS
+        ]
+
+    def assert_exist(self, names, exist=True):
+        for name in names:
+            self.assertEqual(default_storage.exists(name), exist, name)
+
+    def test_backfill_builds_missing_renditions(self):
+        call_command('build_image_renditions', stdout=StringIO())
+        self.assert_exist(self.get_renditions())
+        self.assertEqual(
+            self.recipe.image_renditions['source'], self.first_image
+        )
+
+    def test_replaced_renditions_are_deleted(self):
+        build_renditions(self.recipe.id, self.first_image)
+        first = self.get_renditions()
+        self.assert_exist(first)
+        second_image = save_image('second')
+        Recipe.objects.filter(pk=self.recipe.id).update(image=second_image)
+        build_renditions(self.recipe.id, second_image)
+        self.assert_exist(first, exist=False)
+        self.assert_exist(self.get_renditions())
+
+    def test_outdated_renditions_are_not_kept(self):
+        second_image = save_image('second')
+        Recipe.objects.filter(pk=self.recipe.id).update(image=second_image)
+        build_renditions(self.recipe.id, self.first_image)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_renditions, {})
+        self.assertEqual(
+            default_storage.listdir('recipes/renditions/')[1], []
+        )
+
+    def test_renditions_are_deleted_with_recipe(self):
+        build_renditions(self.recipe.id, self.first_image)
+        renditions = self.get_renditions()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        self.assert_exist(renditions, exist=False)
+
+
+class SimilarRecipesTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password',
+            first_name='Имя', last_name='Фамилия'
+        )
+        self.first, self.second = (
+            Recipe.objects.create(
+                author=self.user, name=f'Рецепт {index}',
+                image='recipes/media/test.png', text='Описание',
+                cooking_time=10
+            )
+            for index in range(2)
+        )
+        for recipe in (self.first, self.second):
+            Favorite.objects.create(user=self.user, recipe=recipe)
+        update_similar_recipes()
+
+    def get_similar(self, recipe):
+        return list(SimilarRecipe.objects.filter(
+            recipe=recipe
+        ).values_list('similar_id', flat=True))
+
+    def test_removed_interaction_updates_neighbors(self):
+        self.assertEqual(self.get_similar(self.second), [self.first.id])
+        Favorite.objects.filter(user=self.user, recipe=self.first).delete()
+        update_similar_recipes([self.first.id])
+        self.assertEqual(self.get_similar(self.second), [])
+        self.assertEqual(self.get_similar(self.first), [])
+
+
+class CartSummaryTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password',
+            first_name='Имя', last_name='Фамилия'
+        )
+        self.ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', image='recipes/media/test.png',
+            text='Описание', cooking_time=10
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.ingredient, amount=500
+        )
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+
+    def get_summary(self):
+        return list(ShoppingCartSummary.objects.filter(
+            user=self.user
+        ).values_list('name', 'measurement_unit', 'amount'))
+
+    def test_renamed_ingredient_leaves_no_lines(self):
+        self.ingredient.name = 'мука пшеничная'
+        self.ingredient.measurement_unit = 'кг'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredient.save()
+        self.assertEqual(self.get_summary(), [('мука пшеничная', 'г', 500000)])
+        ShoppingCart.objects.filter(user=self.user).delete()
+        self.assertEqual(self.get_summary(), [])
+
+    def test_concurrently_inserted_line_is_added_to(self):
+        other = Recipe.objects.create(
+            author=self.user, name='Другой рецепт',
+            image='recipes/media/test.png', text='Описание', cooking_time=10
+        )
+        RecipeIngredient.objects.create(
+            recipe=other, ingredient=self.ingredient, amount=300
+        )
+        get_items = cart.get_summary_items
+        calls = []
+
+        def stale_first_read(user_id, lines):
+            # Строку уже вставила параллельная корзина, но первое
+            # чтение её не видело.
+            calls.append(lines)
+            return {} if len(calls) == 1 else get_items(user_id, lines)
+
+        with mock.patch.object(
+            cart, 'get_summary_items', side_effect=stale_first_read
+        ):
+            ShoppingCart.objects.create(user=self.user, recipe=other)
+        self.assertEqual(self.get_summary(), [('мука', 'г', 800)])
+
+
+class LoadDataTest(TestCase):
+
+    def setUp(self):
+        self.data_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_root, ignore_errors=True)
+
+    def write(self, filename, content):
+        path = os.path.join(self.data_root, filename)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def load(self, path):
+        stdout = StringIO()
+        call_command('load_data', path, batch_size=2, stdout=stdout)
+        return stdout.getvalue()
+
+    def get_ingredients(self):
+        return set(Ingredient.objects.values_list(
+            'name', 'measurement_unit'
+        ))
+
+    def test_json_reload_skips_existing(self):
+        path = self.write('ingredients.json', json.dumps([
+            {'name': 'мука', 'measurement_unit': 'г'},
+            {'name': 'соль', 'measurement_unit': 'г'},
+            {'name': 'мука', 'measurement_unit': 'г'},
+            {'name': 'мука', 'measurement_unit': 'кг'},
+        ], ensure_ascii=False))
+        self.assertIn('Добавлено: 3, пропущено: 1', self.load(path))
+        self.assertIn('Добавлено: 0, пропущено: 4', self.load(path))
+        self.assertEqual(self.get_ingredients(), {
+            ('мука', 'г'), ('мука', 'кг'), ('соль', 'г')
+        })
+
+    def test_csv_adds_only_new_rows(self):
+        Ingredient.objects.create(name='мука', measurement_unit='г')
+        path = self.write('ingredients.csv', 'мука,г\n\nсахар,г\nмёд,мл\n')
+        self.assertIn('Добавлено: 2, пропущено: 1', self.load(path))
+        self.assertEqual(self.get_ingredients(), {
+            ('мука', 'г'), ('мёд', 'мл'), ('сахар', 'г')
+        })
+
+    def test_unknown_format(self):
+        with self.assertRaises(CommandError):
+            self.load(self.write('ingredients.txt', 'мука,г\n'))
@@ -5,7 +5,7 @@ from .models import Follow, User
 
 @admin.register(User)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('username', 'email')
+    list_display = ('username', 'email', 'recipes_count')
     list_filter = ('username', 'email')
 
 
@@ -25,6 +25,11 @@ class User(AbstractUser):
         'Фамилия',
         max_length=150,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -52,9 +57,9 @@ class Follow(models.Model):
     )
 
     class Meta:
-        models.UniqueConstraint(
-            fields=['author', 'user'], name='unique_follow'
-        )
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'author'], name='unique_follow'
+        )]
         verbose_name = 'Подписка на авторов'
         verbose_name_plural = 'Подписки на авторов'
 